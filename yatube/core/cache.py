@@ -0,0 +1,169 @@
+import math
+import random
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+_MISSING = object()
+_stats = defaultdict(lambda: {'hits': 0, 'misses': 0})
+_stats_lock = threading.Lock()
+_served = threading.local()
+
+
+def _count(namespace, hits=0, misses=0):
+    with _stats_lock:
+        stats = _stats[namespace]
+        stats['hits'] += hits
+        stats['misses'] += misses
+
+
+def cache_stats():
+    """ Попадания и промахи по пространствам имён в этом процессе.
+
+    Счётчики не общие: у каждого воркера свои, поэтому отдаются вместе
+    с pid (posts:stats) - так не добавляется запись в общий кэш на
+    каждое чтение.
+    """
+    with _stats_lock:
+        stats = {name: dict(values) for name, values in _stats.items()}
+    for values in stats.values():
+        total = values['hits'] + values['misses']
+        values['hit_rate'] = values['hits'] / total if total else 0.0
+    return stats
+
+
+def reset_cache_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def start_tracking_stale():
+    _served.stale = False
+
+
+def served_stale():
+    """ Отдал ли get_or_compute устаревшее значение с начала отслеживания. """
+    return getattr(_served, 'stale', False)
+
+
+def _expires_early(expires, delta):
+    """ Вероятностное раннее истечение (XFetch).
+
+    Чем ближе срок и чем дольше пересчёт, тем вероятнее, что запрос
+    сочтёт запись устаревшей заранее и пересчитает её, пока остальные
+    ещё получают старое значение.
+    """
+    if expires is None:
+        return False
+    jitter = -delta * settings.CACHE_EARLY_EXPIRATION_BETA * math.log(
+        1 - random.random())
+    return time.time() + jitter >= expires
+
+
+class NamespacedCache:
+    """ Обёртка над бэкендом кэша: ключи с префиксом пространства имён.
+
+    Весь кэш yatube ходит через такие обёртки, поэтому попадания и
+    промахи считаются по пространствам имён, а бэкенд (общий для всех
+    процессов или локальный) выбирается только в настройках CACHES.
+    """
+
+    def __init__(self, namespace, alias=DEFAULT_CACHE_ALIAS):
+        self.namespace = namespace
+        self.alias = alias
+
+    @property
+    def backend(self):
+        # caches отдаёт свой экземпляр бэкенда каждому потоку
+        return caches[self.alias]
+
+    def make_key(self, key):
+        return f'{self.namespace}:{key}'
+
+    def get(self, key, default=None):
+        value = self.backend.get(self.make_key(key), _MISSING)
+        if value is _MISSING:
+            _count(self.namespace, misses=1)
+            return default
+        _count(self.namespace, hits=1)
+        return value
+
+    def get_many(self, keys):
+        keys = {self.make_key(key): key for key in keys}
+        found = self.backend.get_many(keys)
+        _count(self.namespace, hits=len(found),
+               misses=len(keys) - len(found))
+        return {keys[key]: value for key, value in found.items()}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        self.backend.set(self.make_key(key), value, timeout)
+
+    def set_many(self, mapping, timeout=DEFAULT_TIMEOUT):
+        self.backend.set_many(
+            {self.make_key(key): value for key, value in mapping.items()},
+            timeout,
+        )
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT):
+        return self.backend.add(self.make_key(key), value, timeout)
+
+    def incr(self, key, delta=1):
+        return self.backend.incr(self.make_key(key), delta)
+
+    def delete(self, key):
+        self.backend.delete(self.make_key(key))
+
+    def delete_many(self, keys):
+        self.backend.delete_many([self.make_key(key) for key in keys])
+
+    def get_or_compute(self, key, compute, timeout, version=None):
+        """ Значение из кэша или compute(), который выполняет один процесс.
+
+        Пересчитывает тот, кто взял блокировку; остальные в это время
+        отдают устаревшее значение (другой версии или истёкшее, но ещё
+        хранимое CACHE_STALE_TIMEOUT), а при его отсутствии недолго
+        ждут готового. Отдачу устаревшего видно по served_stale().
+        """
+        entry = self.get(key)
+        if entry is not None:
+            value, entry_version, expires, delta = entry
+            if entry_version == version and not _expires_early(
+                    expires, delta):
+                return value
+        lock_key = f'{key}:lock'
+        if not self.add(lock_key, True, settings.CACHE_LOCK_TIMEOUT):
+            if entry is not None:
+                if entry_version != version or (
+                        expires is not None and time.time() >= expires):
+                    _served.stale = True
+                return value
+            value = self._wait(key, version)
+            if value is not _MISSING:
+                return value
+            return compute()
+        try:
+            started = time.perf_counter()
+            value = compute()
+            delta = time.perf_counter() - started
+            expires = None if timeout is None else time.time() + timeout
+            self.set(
+                key, (value, version, expires, delta),
+                None if timeout is None
+                else timeout + settings.CACHE_STALE_TIMEOUT,
+            )
+        finally:
+            self.delete(lock_key)
+        return value
+
+    def _wait(self, key, version):
+        deadline = time.monotonic() + settings.CACHE_LOCK_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(0.01)
+            entry = self.backend.get(self.make_key(key))
+            if entry is not None and entry[1] == version:
+                return entry[0]
+        return _MISSING
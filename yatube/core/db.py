@@ -0,0 +1,109 @@
+import random
+import threading
+import time
+from contextlib import contextmanager
+from functools import partial, wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# Пока стоит эта cookie, пользователь читает свои записи с основной БД
+PRIMARY_COOKIE = 'read_primary'
+# Служебные таблицы, которые читаются и пишутся только в основной БД:
+# кэш в БД с реплики отдавал бы устаревшие версии и блокировки
+PRIMARY_ONLY_APPS = {'django_cache'}
+# Записи этих приложений не возвращают пользователя на основную БД
+UNTRACKED_WRITE_APPS = {'sessions', 'django_cache'}
+
+_state = threading.local()
+
+
+@contextmanager
+def use_replicas():
+    """ Чтение внутри блока уходит на реплики из DATABASE_REPLICAS. """
+    previous = getattr(_state, 'replicas', False)
+    _state.replicas = True
+    try:
+        yield
+    finally:
+        _state.replicas = previous
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """ Прагмы SQLITE_PRAGMAS для каждого нового соединения SQLite. """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def _changed_recently(changed_at):
+    return changed_at is not None and (
+        time.time() - changed_at.timestamp() < settings.DATABASE_REPLICA_LAG)
+
+
+def read_from_replicas(view=None, changed_at=None):
+    """ GET-представление читает с реплик, если пользователь не писал
+    недавно сам.
+
+    changed_at(request, *args, **kwargs) - время последнего изменения
+    данных страницы. Первые DATABASE_REPLICA_LAG секунд после него
+    реплика могла их ещё не получить, поэтому страница читается с
+    основной БД: иначе устаревший рендер попал бы в кэш под новой
+    версией ленты.
+    """
+    if view is None:
+        return partial(read_from_replicas, changed_at=changed_at)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if (request.method not in ('GET', 'HEAD')
+                or PRIMARY_COOKIE in request.COOKIES
+                or changed_at is not None and _changed_recently(
+                    changed_at(request, *args, **kwargs))):
+            return view(request, *args, **kwargs)
+        with use_replicas():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+def start_tracking_writes():
+    _state.wrote = False
+
+
+def wrote_in_request():
+    return getattr(_state, 'wrote', False)
+
+
+class ReplicaRouter:
+    """ Чтение из помеченных представлений - с реплик, запись - в default.
+
+    Записи моделей (кроме сессий и кэша) отмечаются, чтобы
+    ReplicaMiddleware на время DATABASE_REPLICA_LAG вернул автора
+    записи на основную БД.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in PRIMARY_ONLY_APPS:
+            return DEFAULT_DB_ALIAS
+        if settings.DATABASE_REPLICAS and getattr(_state, 'replicas', False):
+            return random.choice(settings.DATABASE_REPLICAS)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label not in UNTRACKED_WRITE_APPS:
+            _state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        pool = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Реплики получают схему копированием основной БД
+        if db != DEFAULT_DB_ALIAS:
+            return False
+        return None
@@ -0,0 +1,192 @@
+import json
+import logging
+import random
+import threading
+import time
+from contextlib import ExitStack
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import BaseCache
+from django.db import connections
+from django.template.backends.django import Template
+
+from .db import PRIMARY_COOKIE, start_tracking_writes, wrote_in_request
+
+logger = logging.getLogger('yatube.requests')
+
+_state = threading.local()
+
+
+class RequestMetrics:
+    """ Счётчики одного запроса: SQL, шаблоны, кэш. """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_count = 0
+        self.db_time = 0.0
+        self.queries = []
+        self.template_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    @property
+    def total_time(self):
+        return time.perf_counter() - self.started
+
+    def as_dict(self):
+        return {
+            'total_ms': round(self.total_time * 1000, 2),
+            'db_queries': self.db_count,
+            'db_ms': round(self.db_time * 1000, 2),
+            'template_ms': round(self.template_time * 1000, 2),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+        }
+
+    def server_timing(self):
+        cache_desc = f'hits={self.cache_hits} misses={self.cache_misses}'
+        return ', '.join((
+            f'db;dur={self.db_time * 1000:.2f};'
+            f'desc="{self.db_count} queries"',
+            f'tpl;dur={self.template_time * 1000:.2f}',
+            f'cache;desc="{cache_desc}"',
+            f'total;dur={self.total_time * 1000:.2f}',
+        ))
+
+
+def current_metrics():
+    """ Счётчики текущего запроса или None вне запроса. """
+    return getattr(_state, 'metrics', None)
+
+
+def _query_wrapper(execute, sql, params, many, context):
+    metrics = current_metrics()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        metrics.db_count += 1
+        metrics.db_time += duration
+        if len(metrics.queries) < settings.SLOW_REQUEST_MAX_QUERIES:
+            metrics.queries.append((sql, round(duration * 1000, 2)))
+
+
+def _timed_render(render):
+    @wraps(render)
+    def wrapper(*args, **kwargs):
+        metrics = current_metrics()
+        if metrics is None or getattr(_state, 'rendering', False):
+            return render(*args, **kwargs)
+        _state.rendering = True
+        started = time.perf_counter()
+        try:
+            return render(*args, **kwargs)
+        finally:
+            metrics.template_time += time.perf_counter() - started
+            _state.rendering = False
+    return wrapper
+
+
+def _counted_get(get):
+    @wraps(get)
+    def wrapper(key, default=None, version=None):
+        value = get(key, default, version)
+        metrics = current_metrics()
+        if metrics is not None:
+            if value is default:
+                metrics.cache_misses += 1
+            else:
+                metrics.cache_hits += 1
+        return value
+    return wrapper
+
+
+def _counted_get_many(get_many):
+    @wraps(get_many)
+    def wrapper(keys, version=None):
+        keys = list(keys)
+        values = get_many(keys, version=version)
+        metrics = current_metrics()
+        if metrics is not None:
+            metrics.cache_hits += len(values)
+            metrics.cache_misses += len(keys) - len(values)
+        return values
+    return wrapper
+
+
+def _instrument_caches():
+    # Экземпляры бэкендов кэша свои у каждого потока
+    for alias in settings.CACHES:
+        backend = caches[alias]
+        if getattr(backend, '_metrics_installed', False):
+            continue
+        backend.get = _counted_get(backend.get)
+        # Базовый get_many сам вызывает get, считать его второй раз незачем
+        if type(backend).get_many is not BaseCache.get_many:
+            backend.get_many = _counted_get_many(backend.get_many)
+        backend._metrics_installed = True
+
+
+class RequestMetricsMiddleware:
+    """ Время SQL, шаблонов и обращения к кэшу в Server-Timing и логах.
+
+    Медленные запросы (дольше SLOW_REQUEST_MS) с вероятностью
+    SLOW_REQUEST_SAMPLE_RATE пишутся в лог вместе со всеми SQL.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if not getattr(Template.render, '_metrics_installed', False):
+            Template.render = _timed_render(Template.render)
+            Template.render._metrics_installed = True
+
+    def __call__(self, request):
+        _instrument_caches()
+        metrics = _state.metrics = RequestMetrics()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(_query_wrapper))
+                response = self.get_response(request)
+        finally:
+            _state.metrics = None
+        response['Server-Timing'] = metrics.server_timing()
+        self.log(request, response, metrics)
+        return response
+
+    def log(self, request, response, metrics):
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            **metrics.as_dict(),
+        }
+        slow = metrics.total_time * 1000 >= settings.SLOW_REQUEST_MS
+        if slow and random.random() < settings.SLOW_REQUEST_SAMPLE_RATE:
+            record['queries'] = metrics.queries
+            logger.warning(json.dumps(record, ensure_ascii=False))
+        else:
+            logger.info(json.dumps(record, ensure_ascii=False))
+
+
+class ReplicaMiddleware:
+    """ После своей записи пользователь DATABASE_REPLICA_LAG секунд
+    читает с основной БД, чтобы не увидеть отставшую реплику. """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start_tracking_writes()
+        response = self.get_response(request)
+        if settings.DATABASE_REPLICAS and wrote_in_request():
+            response.set_cookie(
+                PRIMARY_COOKIE, '1', max_age=settings.DATABASE_REPLICA_LAG,
+                httponly=True, samesite='Lax')
+        return response
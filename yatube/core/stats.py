@@ -0,0 +1,27 @@
+import threading
+from collections import Counter
+
+
+class ProcessCounters:
+    """ Счётчики событий в памяти процесса.
+
+    В общий кэш на каждый запрос ничего не пишется (с кэшем в БД это
+    была бы запись в БД, а его incr теряет прибавки). У каждого воркера
+    свои счётчики, поэтому они отдаются вместе с pid (posts:stats).
+    """
+
+    def __init__(self):
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def incr(self, *keys):
+        with self._lock:
+            self._counts.update(keys)
+
+    def get(self, key):
+        with self._lock:
+            return self._counts[key]
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
@@ -0,0 +1,43 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.BACKGROUND_WORKERS,
+            thread_name_prefix='yatube-worker',
+        )
+    return _executor
+
+
+def _run(func, args, kwargs):
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+def _can_use_threads():
+    # Другой поток не может безопасно делить с нами БД SQLite в памяти
+    is_in_memory = getattr(connection, 'is_in_memory_db', None)
+    return settings.BACKGROUND_WORKERS and not (
+        is_in_memory and is_in_memory())
+
+
+def run_in_background(func, *args, **kwargs):
+    """ Выполняет задачу в локальном пуле потоков после коммита.
+
+    Без пула (BACKGROUND_WORKERS = 0) задача выполняется сразу.
+    """
+    def submit():
+        if _can_use_threads():
+            _get_executor().submit(_run, func, args, kwargs)
+        else:
+            func(*args, **kwargs)
+    transaction.on_commit(submit)
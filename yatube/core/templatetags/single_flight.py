@@ -0,0 +1,51 @@
+from django import template
+from django.core.cache.utils import make_template_fragment_key
+
+from ..cache import NamespacedCache
+
+register = template.Library()
+
+fragment_cache = NamespacedCache('fragments')
+
+
+class SingleFlightCacheNode(template.Node):
+    def __init__(self, nodelist, timeout, fragment_name, vary_on, version):
+        self.nodelist = nodelist
+        self.timeout = timeout
+        self.fragment_name = fragment_name
+        self.vary_on = vary_on
+        self.version = version
+
+    def render(self, context):
+        timeout = self.timeout.resolve(context)
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        version = self.version.resolve(context) if self.version else None
+        return fragment_cache.get_or_compute(
+            make_template_fragment_key(self.fragment_name, vary_on),
+            lambda: self.nodelist.render(context),
+            None if timeout is None else int(timeout),
+            version=version,
+        )
+
+
+@register.tag
+def single_flight_cache(parser, token):
+    """ Как {% cache %}, но фрагмент пересчитывает один запрос.
+
+    {% single_flight_cache timeout name [var ...] [version=var] %}
+    Смена version не удаляет фрагмент: пока он пересчитывается,
+    остальные запросы получают прежний.
+    """
+    nodelist = parser.parse(('endsingle_flight_cache',))
+    parser.delete_first_token()
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(
+            f'{bits[0]} ожидает время жизни и имя фрагмента')
+    version = None
+    if bits[-1].startswith('version='):
+        version = parser.compile_filter(bits.pop()[len('version='):])
+    return SingleFlightCacheNode(
+        nodelist, parser.compile_filter(bits[1]), bits[2],
+        [parser.compile_filter(bit) for bit in bits[3:]], version,
+    )
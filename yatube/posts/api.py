@@ -0,0 +1,177 @@
+from functools import wraps
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import JsonResponse
+
+from core.db import read_from_replicas
+
+from .models import Comment, Follow, Group, Post, User
+from .utils import cursor_paginate
+
+API_VERSION = 'v1'
+# Поле ответа -> путь в ORM; выбираются через .values() без моделей
+POST_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+    'comments_count': 'comments_count',
+}
+COMMENT_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'author': 'author__username',
+}
+GROUP_FIELDS = {
+    'slug': 'slug',
+    'title': 'title',
+    'description': 'description',
+    'posts_count': 'posts_count',
+}
+# Без них не построить курсор
+CURSOR_PATHS = ('id', 'pub_date')
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def api_view(view):
+    """ Только GET, чтение с реплик, ошибки - в JSON. """
+    @read_from_replicas
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return JsonResponse(
+                {'error': 'Метод не поддерживается'}, status=405)
+        try:
+            return JsonResponse(view(request, *args, **kwargs))
+        except ApiError as error:
+            return JsonResponse({'error': str(error)}, status=error.status)
+    return wrapper
+
+
+def selected_fields(request, fields):
+    """ Поля из ?fields=a,b (по умолчанию - все). """
+    names = [name for name in request.GET.get('fields', '').split(',')
+             if name]
+    if not names:
+        return list(fields)
+    unknown = sorted(set(names) - set(fields))
+    if unknown:
+        raise ApiError(f'Неизвестные поля: {", ".join(unknown)}')
+    return names
+
+
+def page_size(request, default):
+    try:
+        limit = int(request.GET.get('limit', default))
+    except ValueError:
+        raise ApiError('limit должен быть числом')
+    return max(1, min(limit, settings.API_MAX_LIMIT))
+
+
+def project(rows, names, fields):
+    """ Строки .values() -> словари с именами полей API. """
+    items = []
+    for row in rows:
+        item = {name: row[fields[name]] for name in names}
+        if 'image' in item:
+            item['image'] = (
+                default_storage.url(item['image']) if item['image']
+                else None)
+        items.append(item)
+    return items
+
+
+def cursor_list(request, queryset, fields, per_page=None):
+    names = selected_fields(request, fields)
+    paths = {fields[name] for name in names} | set(CURSOR_PATHS)
+    page = cursor_paginate(
+        queryset.values(*paths), request.GET.get('cursor', ''),
+        page_size(request, per_page or settings.POSTS_PER_PAGE))
+    return {
+        'results': project(page, names, fields),
+        'next_cursor': page.next_cursor,
+        'previous_cursor': page.previous_cursor,
+    }
+
+
+@api_view
+def posts_list(request):
+    """ Все посты, новые сверху. """
+    return cursor_list(request, Post.objects.all(), POST_FIELDS)
+
+
+@api_view
+def groups_list(request):
+    """ Все группы. """
+    names = selected_fields(request, GROUP_FIELDS)
+    rows = Group.objects.order_by('title').values(
+        *{GROUP_FIELDS[name] for name in names})
+    return {'results': project(rows, names, GROUP_FIELDS)}
+
+
+@api_view
+def group_posts(request, slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'pk', flat=True).first()
+    if group_id is None:
+        raise ApiError('Группа не найдена', status=404)
+    return cursor_list(
+        request, Post.objects.filter(group_id=group_id), POST_FIELDS)
+
+
+@api_view
+def author_posts(request, username):
+    author_id = User.objects.filter(username=username).values_list(
+        'pk', flat=True).first()
+    if author_id is None:
+        raise ApiError('Автор не найден', status=404)
+    return cursor_list(
+        request, Post.objects.filter(author_id=author_id), POST_FIELDS)
+
+
+@api_view
+def follow_feed(request):
+    """ Посты авторов, на которых подписан пользователь. """
+    if not request.user.is_authenticated:
+        raise ApiError('Нужна авторизация', status=401)
+    author_ids = Follow.objects.filter(user=request.user).values('author')
+    return cursor_list(
+        request, Post.objects.filter(author_id__in=author_ids), POST_FIELDS)
+
+
+@api_view
+def post_detail(request, post_id):
+    """ Пост и первая страница комментариев. """
+    names = selected_fields(request, POST_FIELDS)
+    row = Post.objects.filter(pk=post_id).values(
+        *{POST_FIELDS[name] for name in names}).first()
+    if row is None:
+        raise ApiError('Пост не найден', status=404)
+    comments = cursor_paginate(
+        Comment.objects.filter(post_id=post_id).values(
+            *COMMENT_FIELDS.values()),
+        '', settings.COMMENTS_PER_PAGE)
+    return {
+        **project([row], names, POST_FIELDS)[0],
+        'comments': project(comments, list(COMMENT_FIELDS), COMMENT_FIELDS),
+        'comments_next_cursor': comments.next_cursor,
+    }
+
+
+@api_view
+def post_comments(request, post_id):
+    """ Комментарии поста по курсору. """
+    if not Post.objects.filter(pk=post_id).exists():
+        raise ApiError('Пост не найден', status=404)
+    return cursor_list(
+        request, Comment.objects.filter(post_id=post_id), COMMENT_FIELDS,
+        per_page=settings.COMMENTS_PER_PAGE)
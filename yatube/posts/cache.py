@@ -0,0 +1,88 @@
+import random
+import time
+
+from django.conf import settings
+
+from core.cache import NamespacedCache
+
+FEED_VERSION_KEY = 'version:{}'
+FEED_MODIFIED_KEY = 'modified:{}'
+INDEX_FEED = 'index'
+
+feed_cache = NamespacedCache('posts:feeds')
+
+
+def group_feed(group_id):
+    return f'group:{group_id}'
+
+
+def profile_feed(author_id):
+    return f'profile:{author_id}'
+
+
+def syndicated_feed(feed):
+    """ Версия RSS и Atom ленты: меняется только вместе с их содержимым. """
+    return f'syndication:{feed}'
+
+
+def post_feeds(post):
+    """ Ленты, в которых показывается пост. """
+    feeds = [INDEX_FEED, profile_feed(post.author_id)]
+    if post.group_id:
+        feeds.append(group_feed(post.group_id))
+    return feeds
+
+
+def _new_version():
+    # Версия от времени: после вытеснения ключа не совпадёт со старой
+    return int(time.time() * 1000)
+
+
+def get_feed_version(feed):
+    key = FEED_VERSION_KEY.format(feed)
+    version = feed_cache.get(key)
+    if version is None:
+        feed_cache.add(key, _new_version(), None)
+        version = feed_cache.get(key)
+    return version
+
+
+def get_feed_modified(feed):
+    """ Время последнего изменения ленты (timestamp). """
+    key = FEED_MODIFIED_KEY.format(feed)
+    modified = feed_cache.get(key)
+    if modified is None:
+        # Ключ вытеснен: считаем ленту изменённой сейчас
+        feed_cache.add(key, int(time.time()), None)
+        modified = feed_cache.get(key)
+    return modified
+
+
+def bump_feed_versions(*feeds, syndication=True):
+    """ Инвалидирует фрагменты лент, меняя их версию.
+
+    syndication=False - изменение не видно в RSS и Atom (комментарии,
+    миниатюры): их версия остаётся прежней.
+    """
+    now = int(time.time())
+    feeds = set(feeds)
+    if syndication:
+        feeds |= {syndicated_feed(feed) for feed in feeds}
+    for feed in feeds:
+        key = FEED_VERSION_KEY.format(feed)
+        try:
+            feed_cache.incr(key)
+        except ValueError:
+            feed_cache.set(key, _new_version(), None)
+        feed_cache.set(FEED_MODIFIED_KEY.format(feed), now, None)
+
+
+def feed_cache_context(feed):
+    """ Версия и время жизни фрагмента ленты для тега cache. """
+    return {
+        'feed_version': get_feed_version(feed),
+        'feed_cache_timeout': (
+            settings.FEED_CACHE_TIMEOUT
+            + random.randint(0, settings.FEED_CACHE_JITTER)
+        ),
+    }
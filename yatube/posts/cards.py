@@ -0,0 +1,58 @@
+import hashlib
+
+from django.conf import settings
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from core.cache import NamespacedCache
+
+from .thumbnails import thumbnails_ready
+
+CARD_KEY = '{}:{}:{}'
+CARD_TEMPLATE = 'includes/post_card.html'
+# Флаги шаблона карточки, от которых зависит её разметка
+CARD_FLAGS = ('author_link', 'detail_link', 'groups_posts_link')
+
+card_cache = NamespacedCache('posts:cards')
+
+
+def card_stamp(post):
+    """ Отпечаток всего, что показывает карточка.
+
+    Правка поста, новый комментарий, переименование автора или
+    группы меняют отпечаток, и старая карточка просто не читается.
+    """
+    author = post.author
+    group = post.group
+    raw = '\0'.join(str(part) for part in (
+        post.text, post.image.name if post.image else '',
+        post.comments_count, author.username, author.get_full_name(),
+        group.slug if group else '',
+    ))
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def card_key(post, variant):
+    return CARD_KEY.format(post.pk, card_stamp(post), variant)
+
+
+def render_cards(posts, **flags):
+    """ HTML карточек постов: из кэша одним get_many, недостающие - рендер.
+
+    Карточки с ещё не нарезанной картинкой не кэшируются, чтобы
+    заглушка не пережила появление миниатюры.
+    """
+    variant = ''.join('1' if flags.get(flag) else '0' for flag in CARD_FLAGS)
+    keys = [(card_key(post, variant), post) for post in posts]
+    cached = card_cache.get_many([key for key, _ in keys])
+    cards, rendered = [], {}
+    for key, post in keys:
+        card = cached.get(key)
+        if card is None:
+            card = render_to_string(CARD_TEMPLATE, {'post': post, **flags})
+            if not post.image or thumbnails_ready(post.image):
+                rendered[key] = card
+        cards.append(mark_safe(card))
+    if rendered:
+        card_cache.set_many(rendered, settings.POST_CARD_CACHE_TIMEOUT)
+    return cards
@@ -0,0 +1,161 @@
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from core.cache import served_stale, start_tracking_stale
+from core.stats import ProcessCounters
+
+from .cache import (INDEX_FEED, get_feed_modified, get_feed_version,
+                    group_feed, profile_feed)
+from .models import AuthorStats, Follow, Group, Post, User
+
+CONDITIONAL_VIEWS = (
+    'index', 'group_posts', 'profile', 'post_detail', 'syndication')
+
+conditional_counts = ProcessCounters()
+
+
+def _etag(request, *parts):
+    # Шапка страницы зависит от пользователя
+    raw = ':'.join(str(part) for part in (request.user.pk or 0, *parts))
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def _modified(feed):
+    return datetime.fromtimestamp(get_feed_modified(feed), timezone.utc)
+
+
+def _group_id(slug):
+    return Group.objects.filter(slug=slug).values_list(
+        'pk', flat=True).first()
+
+
+def _author(username):
+    return User.objects.filter(username=username).values_list(
+        'pk', flat=True).first()
+
+
+def _author_counters(author_id):
+    return AuthorStats.objects.filter(user_id=author_id).values_list(
+        'posts_count', 'followers_count', 'following_count').first()
+
+
+def index_etag(request):
+    return _etag(request, get_feed_version(INDEX_FEED))
+
+
+def index_last_modified(request):
+    return _modified(INDEX_FEED)
+
+
+def group_etag(request, slug):
+    group_id = _group_id(slug)
+    if group_id is None:
+        return None
+    return _etag(request, get_feed_version(group_feed(group_id)))
+
+
+def group_last_modified(request, slug):
+    group_id = _group_id(slug)
+    return None if group_id is None else _modified(group_feed(group_id))
+
+
+def profile_etag(request, username):
+    author_id = _author(username)
+    if author_id is None:
+        return None
+    following = (
+        request.user.is_authenticated
+        and Follow.objects.filter(
+            user=request.user, author_id=author_id).exists()
+    )
+    return _etag(
+        request, get_feed_version(profile_feed(author_id)),
+        _author_counters(author_id), following,
+    )
+
+
+def profile_last_modified(request, username):
+    author_id = _author(username)
+    return None if author_id is None else _modified(profile_feed(author_id))
+
+
+def _post_feeds(post_id):
+    """ Ленты, от которых зависит страница поста, и число комментариев. """
+    post = Post.objects.filter(pk=post_id).values_list(
+        'author_id', 'group_id', 'comments_count').first()
+    if post is None:
+        return None, None
+    author_id, group_id, comments_count = post
+    # Правки поста и новые комментарии меняют версию ленты автора,
+    # переименование группы - версию ленты группы
+    feeds = [profile_feed(author_id)]
+    if group_id:
+        feeds.append(group_feed(group_id))
+    return feeds, (comments_count, _author_counters(author_id))
+
+
+def post_etag(request, post_id):
+    feeds, counters = _post_feeds(post_id)
+    if feeds is None:
+        return None
+    return _etag(
+        request, *(get_feed_version(feed) for feed in feeds), *counters)
+
+
+def post_last_modified(request, post_id):
+    feeds, _ = _post_feeds(post_id)
+    return None if feeds is None else max(map(_modified, feeds))
+
+
+def record_conditional(view, not_modified):
+    if not_modified:
+        conditional_counts.incr((view, 'requests'), (view, 'not_modified'))
+    else:
+        conditional_counts.incr((view, 'requests'))
+
+
+def conditional_stats():
+    """ Доля ответов 304 по каждому представлению в этом процессе. """
+    stats = {
+        view: {
+            kind: conditional_counts.get((view, kind))
+            for kind in ('requests', 'not_modified')
+        }
+        for view in CONDITIONAL_VIEWS
+    }
+    for view_stats in stats.values():
+        view_stats['hit_rate'] = (
+            view_stats['not_modified'] / view_stats['requests']
+            if view_stats['requests'] else 0.0
+        )
+    return stats
+
+
+def drop_stale_validators(response):
+    """ Ответ собран из устаревшего кэша: валидаторы новой версии к нему
+    не подходят, иначе клиент получал бы 304 до следующего изменения. """
+    if served_stale():
+        del response['ETag']
+        del response['Last-Modified']
+        patch_cache_control(response, no_cache=True)
+    return response
+
+
+def conditional_page(name, etag_func, last_modified_func):
+    """ ETag и Last-Modified для GET: без изменений - 304 без рендера. """
+    def decorator(view):
+        conditional_view = condition(etag_func, last_modified_func)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            start_tracking_stale()
+            response = conditional_view(request, *args, **kwargs)
+            if request.method in ('GET', 'HEAD'):
+                record_conditional(name, response.status_code == 304)
+            return drop_stale_validators(response)
+        return wrapper
+    return decorator
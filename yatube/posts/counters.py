@@ -0,0 +1,91 @@
+from django.apps import apps as global_apps
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+BATCH_SIZE = 1000
+
+
+def _shifted(deltas):
+    return {
+        field: Greatest(F(field) + delta, Value(0))
+        for field, delta in deltas.items()
+    }
+
+
+def change_counters(queryset, **deltas):
+    """ Атомарно сдвигает счётчики, не опускаясь ниже нуля. """
+    return queryset.update(**_shifted(deltas))
+
+
+def change_author_stats(user_id, **deltas):
+    """ Сдвигает счётчики пользователя, при росте создаёт запись. """
+    from .models import AuthorStats
+
+    stats = AuthorStats.objects.filter(user_id=user_id)
+    if change_counters(stats, **deltas) or min(deltas.values()) < 0:
+        return
+    AuthorStats.objects.get_or_create(user_id=user_id)
+    change_counters(stats, **deltas)
+
+
+def get_author_stats(user):
+    """ Счётчики пользователя без запроса, если они уже подгружены. """
+    from .models import AuthorStats
+
+    try:
+        return user.stats
+    except AuthorStats.DoesNotExist:
+        return AuthorStats(user=user)
+
+
+def _count(model, field):
+    counted = model.objects.filter(**{field: OuterRef('pk')}).order_by()
+    counted = counted.values(field).annotate(total=Count('pk'))
+    return Coalesce(Subquery(counted.values('total')), Value(0))
+
+
+def _scoped(queryset, pks):
+    # None - вся таблица, иначе пачки pk, чтобы не упереться в лимит
+    # параметров запроса
+    if pks is None:
+        yield queryset
+        return
+    pks = sorted(pks)
+    for start in range(0, len(pks), BATCH_SIZE):
+        yield queryset.filter(pk__in=pks[start:start + BATCH_SIZE])
+
+
+def recount_counters(apps=global_apps, users=None, groups=None, posts=None):
+    """ Пересчитывает счётчики пакетными UPDATE.
+
+    users, groups и posts ограничивают пересчёт этими pk, None - все.
+    """
+    Post = apps.get_model('posts', 'Post')
+    Group = apps.get_model('posts', 'Group')
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    AuthorStats = apps.get_model('posts', 'AuthorStats')
+    User = AuthorStats._meta.get_field('user').related_model
+
+    for users_batch in _scoped(User.objects.filter(stats__isnull=True),
+                               users):
+        missing = users_batch.values_list('pk', flat=True)
+        while True:
+            batch = [
+                AuthorStats(user_id=user_id)
+                for user_id in missing[:BATCH_SIZE]
+            ]
+            if not batch:
+                break
+            AuthorStats.objects.bulk_create(batch, ignore_conflicts=True)
+
+    for batch in _scoped(Group.objects.all(), groups):
+        batch.update(posts_count=_count(Post, 'group'))
+    for batch in _scoped(Post.objects.all(), posts):
+        batch.update(comments_count=_count(Comment, 'post'))
+    for batch in _scoped(AuthorStats.objects.all(), users):
+        batch.update(
+            posts_count=_count(Post, 'author'),
+            followers_count=_count(Follow, 'author'),
+            following_count=_count(Follow, 'user'),
+        )
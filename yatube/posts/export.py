@@ -0,0 +1,90 @@
+import csv
+import json
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .api import COMMENT_FIELDS, POST_FIELDS
+from .models import Comment, Post
+
+EXPORTS = {
+    'posts': (Post, POST_FIELDS, {
+        'group': 'group__slug', 'author': 'author__username'}),
+    'comments': (Comment, {**COMMENT_FIELDS, 'post': 'post_id'}, {
+        'group': 'post__group__slug', 'author': 'author__username'}),
+}
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def parse_day(value):
+    """ Начало дня ГГГГ-ММ-ДД в текущем часовом поясе. """
+    day = parse_date(value)
+    if day is None:
+        raise ValueError(f'Неверная дата: {value}')
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def export_queryset(kind, group=None, author=None, since=None,
+                    until=None):
+    """ Строки выгрузки (.values()) по порядку id.
+
+    since и until - первый и последний день (ГГГГ-ММ-ДД) включительно.
+    """
+    model, fields, filters = EXPORTS[kind]
+    queryset = model.objects.order_by('pk')
+    if group:
+        queryset = queryset.filter(**{filters['group']: group})
+    if author:
+        queryset = queryset.filter(**{filters['author']: author})
+    if since:
+        queryset = queryset.filter(pub_date__gte=parse_day(since))
+    if until:
+        queryset = queryset.filter(
+            pub_date__lt=parse_day(until) + timedelta(days=1))
+    return queryset.values(*fields.values())
+
+
+def _rows(queryset, fields):
+    # iterator не держит в памяти всю таблицу, а читает пачками
+    for row in queryset.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE):
+        yield {name: row[path] for name, path in fields.items()}
+
+
+class _Echo:
+    """ Файл для csv.writer, который возвращает строку вместо записи. """
+
+    def write(self, value):
+        return value
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(
+            row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def csv_lines(rows, kind):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(list(EXPORTS[kind][1]))
+    for row in rows:
+        yield writer.writerow([
+            value.isoformat() if isinstance(value, datetime) else value
+            for value in row.values()
+        ])
+
+
+def export_lines(kind, export_format, **filters):
+    """ Генератор строк выгрузки в формате ndjson или csv.
+
+    Неверные фильтры дают ValueError сразу, до первой строки.
+    """
+    rows = _rows(export_queryset(kind, **filters), EXPORTS[kind][1])
+    if export_format == 'csv':
+        return csv_lines(rows, kind)
+    return ndjson_lines(rows)
@@ -0,0 +1,218 @@
+import json
+import math
+import os
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import (CaptureQueriesContext,
+                               setup_test_environment,
+                               teardown_test_environment)
+from django.urls import reverse
+
+from posts.models import AuthorStats, Group, Post
+from posts.seeding import seed
+
+DEFAULT_BASELINE = os.path.join(
+    settings.BASE_DIR, 'benchmarks', 'baseline.json')
+# Тестовая SQLite по умолчанию в памяти: для --keepdb нужен файл
+KEEPDB_NAME = os.path.join(settings.BASE_DIR, 'benchmarks', 'db.sqlite3')
+
+
+def percentile(values, rank):
+    """ Перцентиль по ближайшему рангу. """
+    ordered = sorted(values)
+    index = max(0, math.ceil(rank / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+def find_regressions(results, baseline, tolerance, slack_ms):
+    """ Страницы, где p95 или число запросов выросли сверх допуска. """
+    regressions = []
+    for name, expected in baseline.items():
+        actual = results.get(name)
+        if actual is None:
+            continue
+        allowed = max(expected['p95_ms'] * (1 + tolerance),
+                      expected['p95_ms'] + slack_ms)
+        if actual['p95_ms'] > allowed:
+            regressions.append(
+                f'{name}: p95 {actual["p95_ms"]} мс, '
+                f'в базе {expected["p95_ms"]} мс')
+        if actual['queries_max'] > expected['queries_max']:
+            regressions.append(
+                f'{name}: {actual["queries_max"]} SQL-запросов, '
+                f'в базе {expected["queries_max"]}')
+    return regressions
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогоняет основные страницы на синтетических данных во временной '
+        'БД и сравнивает p50/p95/p99 и число запросов с сохранённой базой'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=200000)
+        parser.add_argument('--comments', type=int, default=400000)
+        parser.add_argument('--follows', type=int, default=200000)
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Запросов на каждую страницу')
+        parser.add_argument('--warmup', type=int, default=10)
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кэш перед каждым запросом')
+        parser.add_argument(
+            '--keepdb', action='store_true',
+            help='Не удалять тестовую БД и не заполнять её повторно '
+                 f'(SQLite - файл {KEEPDB_NAME})')
+        parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+        parser.add_argument(
+            '--save-baseline', action='store_true',
+            help='Сохранить результаты как новую базу')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.25,
+            help='Допустимый рост p95, доля от базы')
+        parser.add_argument(
+            '--slack-ms', type=float, default=5,
+            help='Рост p95 меньше этого числа мс регрессией не считается')
+
+    def handle(self, *args, **options):
+        if not (options['save_baseline']
+                or os.path.exists(options['baseline'])):
+            # Без базы сравнивать не с чем: прогон не должен «пройти»
+            raise CommandError(
+                f'База {options["baseline"]} не найдена, сохраните её '
+                'флагом --save-baseline')
+        test_settings = connection.settings_dict['TEST']
+        if (options['keepdb'] and connection.vendor == 'sqlite'
+                and not test_settings.get('NAME')):
+            os.makedirs(os.path.dirname(KEEPDB_NAME), exist_ok=True)
+            test_settings['NAME'] = KEEPDB_NAME
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            if not Post.objects.exists():
+                self.seed(options)
+            results = self.run_scenarios(options)
+        finally:
+            connection.creation.destroy_test_db(
+                old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+        self.report(results)
+        if options['save_baseline']:
+            os.makedirs(os.path.dirname(options['baseline']), exist_ok=True)
+            with open(options['baseline'], 'w') as baseline:
+                json.dump(results, baseline, indent=2, sort_keys=True)
+            self.stdout.write(f'База сохранена в {options["baseline"]}')
+            return
+        self.compare(results, options)
+
+    def seed(self, options):
+        started = time.perf_counter()
+        seed(
+            users=options['users'],
+            groups=options['groups'],
+            posts=options['posts'],
+            comments=options['comments'],
+            follows=options['follows'],
+        )
+        self.stdout.write(
+            f'Данные созданы за {time.perf_counter() - started:.1f} с')
+
+    def scenarios(self, rng):
+        """ Страница -> (клиент, функция, выдающая метод, URL и данные). """
+        slugs = list(Group.objects.values_list('slug', flat=True))
+        authors = list(AuthorStats.objects.order_by(
+            '-posts_count').values_list('user__username', flat=True)[:100])
+        post_ids = list(Post.objects.order_by('?').values_list(
+            'pk', flat=True)[:1000])
+        reader = AuthorStats.objects.order_by(
+            '-following_count').values_list('user', flat=True).first()
+        guest = Client()
+        member = Client()
+        member.force_login(AuthorStats.objects.get(pk=reader).user)
+
+        def page():
+            return rng.randint(1, 5)
+
+        return {
+            'index': (guest, lambda: (
+                'get', reverse('posts:index'), {'page': page()})),
+            'group_posts': (guest, lambda: (
+                'get', reverse('posts:group_list',
+                               args=(rng.choice(slugs),)),
+                {'page': page()})),
+            'profile': (guest, lambda: (
+                'get', reverse('posts:profile', args=(rng.choice(authors),)),
+                {'page': page()})),
+            'post_detail': (guest, lambda: (
+                'get', reverse('posts:post_detail',
+                               args=(rng.choice(post_ids),)), {})),
+            'follow_index': (member, lambda: (
+                'get', reverse('posts:follow_index'), {'page': page()})),
+            'post_create': (member, lambda: (
+                'post', reverse('posts:post_create'),
+                {'text': f'Пост из бенчмарка {rng.random()}'})),
+        }
+
+    def run_scenarios(self, options):
+        rng = random.Random(0)
+        results = {}
+        for name, (client, make_request) in self.scenarios(rng).items():
+            for _ in range(options['warmup']):
+                method, url, data = make_request()
+                getattr(client, method)(url, data)
+            latencies, queries = [], []
+            started = time.perf_counter()
+            for _ in range(options['requests']):
+                method, url, data = make_request()
+                if options['cold']:
+                    cache.clear()
+                with CaptureQueriesContext(connection) as context:
+                    request_started = time.perf_counter()
+                    response = getattr(client, method)(url, data)
+                    latencies.append(time.perf_counter() - request_started)
+                if response.status_code >= 400:
+                    raise CommandError(
+                        f'{name}: {url} ответил {response.status_code}')
+                queries.append(len(context))
+            elapsed = time.perf_counter() - started
+            results[name] = {
+                'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+                'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+                'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+                'queries_avg': round(sum(queries) / len(queries), 2),
+                'queries_max': max(queries),
+                'rps': round(options['requests'] / elapsed, 1),
+            }
+        return results
+
+    def report(self, results):
+        header = (f'{"страница":<14}{"p50":>9}{"p95":>9}{"p99":>9}'
+                  f'{"SQL":>7}{"SQL max":>9}{"rps":>8}')
+        self.stdout.write(header)
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<14}{result["p50_ms"]:>9}{result["p95_ms"]:>9}'
+                f'{result["p99_ms"]:>9}{result["queries_avg"]:>7}'
+                f'{result["queries_max"]:>9}{result["rps"]:>8}'
+            )
+
+    def compare(self, results, options):
+        with open(options['baseline']) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = find_regressions(
+            results, baseline, options['tolerance'], options['slack_ms'])
+        if regressions:
+            raise CommandError(
+                'Регрессия производительности:\n' + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS('Регрессий нет'))
@@ -0,0 +1,125 @@
+import os
+import random
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.test.utils import override_settings
+
+from posts.management.commands.benchmark import percentile
+from posts.models import Comment, Post, User
+from posts.seeding import seed
+from posts.utils import feed_posts
+
+
+def _p95_ms(timings):
+    return round(percentile(timings, 95) * 1000, 1) if timings else 0
+
+
+def _worker(operation, timings, locked, lock, deadline, seed_value):
+    """ Повторяет operation до срока; занятая БД считается в locked. """
+    from django.db import connection as thread_connection
+    rng = random.Random(seed_value)
+    try:
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                operation(rng)
+            except OperationalError:
+                with lock:
+                    locked[0] += 1
+                continue
+            with lock:
+                timings.append(time.perf_counter() - started)
+    finally:
+        thread_connection.close()
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагружает файловую SQLite одновременными чтениями лент и записью '
+        'комментариев с каждым профилем прагм из SQLITE_PROFILES'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--posts', type=int, default=5000)
+        parser.add_argument(
+            '--profiles', nargs='+', default=list(settings.SQLITE_PROFILES))
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Сравнение написано для SQLite')
+        self.stdout.write(
+            f'{"профиль":<10}{"чтений/с":>10}{"записей/с":>11}'
+            f'{"p95 чт.":>9}{"p95 зап.":>10}{"locked":>8}')
+        for profile in options['profiles']:
+            with override_settings(
+                    SQLITE_PRAGMAS=settings.SQLITE_PROFILES[profile]):
+                result = self.run_profile(options)
+            self.stdout.write(
+                f'{profile:<10}{result["reads"]:>10}{result["writes"]:>11}'
+                f'{result["read_p95_ms"]:>9}{result["write_p95_ms"]:>10}'
+                f'{result["locked"]:>8}')
+
+    def run_profile(self, options):
+        test_settings = connection.settings_dict['TEST']
+        old_test_name = test_settings['NAME']
+        with tempfile.TemporaryDirectory() as directory:
+            # Блокировки видны только на файле, не на БД в памяти
+            test_settings['NAME'] = os.path.join(directory, 'bench.sqlite3')
+            old_name = connection.creation.create_test_db(
+                verbosity=0, autoclobber=True, serialize=False)
+            try:
+                seed(users=200, groups=10, posts=options['posts'],
+                     comments=options['posts'], follows=options['posts'])
+                return self.load(options)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+                test_settings['NAME'] = old_test_name
+
+    def load(self, options):
+        post_ids = list(Post.objects.values_list('pk', flat=True))
+        user_ids = list(User.objects.values_list('pk', flat=True))
+        pages = max(1, len(post_ids) // settings.POSTS_PER_PAGE)
+        deadline = time.monotonic() + options['seconds']
+        lock = threading.Lock()
+        reads, writes, locked = [], [], [0]
+
+        def read(rng):
+            page = rng.randrange(pages) * settings.POSTS_PER_PAGE
+            list(feed_posts()[page:page + settings.POSTS_PER_PAGE])
+
+        def write(rng):
+            Comment.objects.create(
+                post_id=rng.choice(post_ids),
+                author_id=rng.choice(user_ids),
+                text='Комментарий из нагрузочного теста',
+            )
+
+        threads = [
+            threading.Thread(target=_worker, args=(
+                read, reads, locked, lock, deadline, i))
+            for i in range(options['readers'])
+        ] + [
+            threading.Thread(target=_worker, args=(
+                write, writes, locked, lock, deadline, -i - 1))
+            for i in range(options['writers'])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return {
+            'reads': round(len(reads) / options['seconds']),
+            'writes': round(len(writes) / options['seconds']),
+            'read_p95_ms': _p95_ms(reads),
+            'write_p95_ms': _p95_ms(writes),
+            'locked': locked[0],
+        }
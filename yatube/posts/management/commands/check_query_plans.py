@@ -0,0 +1,80 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from posts.models import Comment, Post
+from posts.utils import feed_posts
+
+BAD_STEPS = ('USE TEMP B-TREE',)
+INDEX_STEPS = (
+    'USING INDEX', 'USING COVERING INDEX', 'USING INTEGER PRIMARY KEY')
+
+
+def hot_querysets():
+    """ Запросы страниц: имя -> (queryset, допустима ли сортировка). """
+    now = timezone.now()
+    after = Q(pub_date__lt=now) | Q(pub_date=now, pk__lt=1)
+    per_page = settings.POSTS_PER_PAGE
+    by_key = ('-pub_date', '-pk')
+    group_posts = feed_posts(Post.objects.filter(group_id=1))
+    author_posts = feed_posts(Post.objects.filter(author_id=1))
+    comments = Comment.objects.filter(post_id=1).select_related('author')
+    return {
+        'index': (feed_posts()[:per_page], False),
+        'index cursor': (
+            feed_posts().filter(after).order_by(*by_key)[:per_page], False),
+        'group_posts': (group_posts[:per_page], False),
+        'group_posts cursor': (
+            group_posts.filter(after).order_by(*by_key)[:per_page], False),
+        'profile': (author_posts[:per_page], False),
+        'profile cursor': (
+            author_posts.filter(after).order_by(*by_key)[:per_page], False),
+        'post_detail': (
+            feed_posts().select_related('author__stats').filter(pk=1),
+            False),
+        'post_detail comments': (
+            comments.filter(after).order_by(*by_key)[
+                :settings.COMMENTS_PER_PAGE], False),
+        # Слияние постов многих авторов без сортировки не обойдётся:
+        # горячий путь для таких читателей - готовые ленты (timelines)
+        'follow_index': (
+            feed_posts(Post.objects.filter(
+                author__following__user_id=1))[:per_page], True),
+    }
+
+
+def plan_problems(plan, allow_sort):
+    problems = []
+    for step in plan.splitlines():
+        if 'SCAN' in step and not any(
+                index in step for index in INDEX_STEPS):
+            problems.append(step)
+        if not allow_sort and any(bad in step for bad in BAD_STEPS):
+            problems.append(step)
+    return problems
+
+
+class Command(BaseCommand):
+    help = (
+        'Проверяет EXPLAIN QUERY PLAN запросов страниц: '
+        'без полного сканирования таблиц и сортировки во временном B-дереве'
+    )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Проверка написана для планов SQLite')
+        failed = False
+        for name, (queryset, allow_sort) in hot_querysets().items():
+            plan = queryset.explain()
+            problems = plan_problems(plan, allow_sort)
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{name}:\n{plan}')
+            if problems:
+                failed = True
+                self.stderr.write(f'{name}: ' + '; '.join(problems))
+            else:
+                self.stdout.write(f'{name}: OK')
+        if failed:
+            raise CommandError('Есть запросы без подходящего индекса')
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.export import EXPORTS, FORMATS, export_lines
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоково выгружает посты или комментарии в NDJSON или CSV '
+        'с постоянным расходом памяти'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=list(EXPORTS))
+        parser.add_argument(
+            '--format', choices=list(FORMATS), default='ndjson')
+        parser.add_argument('--group', help='slug группы')
+        parser.add_argument('--author', help='username автора')
+        parser.add_argument('--since', help='Первый день, ГГГГ-ММ-ДД')
+        parser.add_argument('--until', help='Последний день, ГГГГ-ММ-ДД')
+        parser.add_argument(
+            '--output', help='Файл выгрузки (по умолчанию - stdout)')
+
+    def handle(self, *args, **options):
+        try:
+            lines = export_lines(
+                options['kind'], options['format'],
+                group=options['group'],
+                author=options['author'],
+                since=options['since'],
+                until=options['until'],
+            )
+        except ValueError as error:
+            raise CommandError(error)
+        if options['output'] is None:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        with open(options['output'], 'w', encoding='utf-8',
+                  newline='') as output:
+            output.writelines(lines)
@@ -0,0 +1,78 @@
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from posts.seeding import BATCH_SIZE, SEED_PASSWORD, seed
+
+
+@contextmanager
+def fast_writes():
+    """ Отключает проверку внешних ключей и fsync на время загрузки. """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('PRAGMA synchronous = OFF')
+        with connection.constraint_checks_disabled():
+            yield
+        if connection.vendor == 'sqlite':
+            synchronous = settings.SQLITE_PRAGMAS.get('synchronous', 'full')
+            cursor.execute(f'PRAGMA synchronous = {synchronous}')
+    connection.check_constraints()
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет БД синтетическими пользователями, группами, постами, '
+        'комментариями и подписками со степенным распределением'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100000)
+        parser.add_argument('--groups', type=int, default=200)
+        parser.add_argument('--posts', type=int, default=1000000)
+        parser.add_argument('--comments', type=int, default=2000000)
+        parser.add_argument('--follows', type=int, default=1000000)
+        parser.add_argument(
+            '--alpha', type=float, default=1.2,
+            help='Показатель степенного закона популярности')
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--fast', action='store_true',
+            help='Отключить проверки ограничений на время загрузки')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        done = {}
+
+        def progress(model, count):
+            name = model._meta.verbose_name_plural
+            done[name] = done.get(name, 0) + count
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{name}: {done[name]}')
+
+        with ExitStack() as stack:
+            if options['fast']:
+                stack.enter_context(fast_writes())
+            stack.enter_context(transaction.atomic())
+            seed(
+                users=options['users'],
+                groups=options['groups'],
+                posts=options['posts'],
+                comments=options['comments'],
+                follows=options['follows'],
+                alpha=options['alpha'],
+                days=options['days'],
+                batch_size=options['batch_size'],
+                seed_value=options['seed'],
+                progress=progress,
+            )
+        for name, count in done.items():
+            self.stdout.write(f'{name}: {count}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.perf_counter() - started:.1f} с, '
+            f'пароль пользователей: {SEED_PASSWORD}'
+        ))
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.sitemaps import write_sitemaps
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересобирает в SITEMAP_ROOT куски карты сайта, затронутые новыми '
+        'и изменёнными постами, группами и авторами, и индекс sitemap.xml'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--domain', default=settings.SITEMAP_DOMAIN)
+        parser.add_argument(
+            '--protocol', choices=('http', 'https'), default='https')
+        parser.add_argument(
+            '--full', action='store_true', help='Пересобрать все куски')
+
+    def handle(self, *args, **options):
+        changed = write_sitemaps(
+            options['domain'], options['protocol'], full=options['full'])
+        for name in changed:
+            self.stdout.write(name)
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересобрано файлов: {len(changed)}'))
@@ -0,0 +1,54 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.importer import IMPORT_KINDS, Importer, read_records
+
+
+class Command(BaseCommand):
+    help = (
+        'Пакетно загружает посты, комментарии и подписки из NDJSON или CSV '
+        '(формат - по расширению файла); счётчики и кэши обновляются '
+        'один раз в конце'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--posts', help='Поля: id, author, group, text, pub_date, image')
+        parser.add_argument(
+            '--comments',
+            help='Поля: post (id из файла постов), author, text, pub_date')
+        parser.add_argument('--follows', help='Поля: user, author')
+        parser.add_argument(
+            '--media-root', help='Каталог, от которого считаются пути image')
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.IMPORT_BATCH_SIZE)
+        parser.add_argument(
+            '--workers', type=int, default=settings.IMPORT_IMAGE_WORKERS,
+            help='Потоков копирования картинок')
+
+    def handle(self, *args, **options):
+        if not any(options[kind] for kind in IMPORT_KINDS):
+            raise CommandError('Укажите хотя бы один из --posts, '
+                               '--comments, --follows')
+        started = time.perf_counter()
+        importer = Importer(
+            batch_size=options['batch_size'],
+            media_root=options['media_root'],
+            workers=options['workers'],
+        )
+        try:
+            for kind in IMPORT_KINDS:
+                if options[kind]:
+                    getattr(importer, f'import_{kind}')(
+                        read_records(options[kind]))
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+        finally:
+            # Загруженные пачки уже в БД: производные данные нужны и им
+            counts = importer.finish()
+        for kind, count in counts.items():
+            self.stdout.write(f'{kind}: {count}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.perf_counter() - started:.1f} с'))
@@ -0,0 +1,28 @@
+from django.db import migrations
+
+from posts.search import (BACKFILL_SQL, CREATE_SQL, DROP_SQL,
+                          search_enabled)
+
+
+def create_search_index(apps, schema_editor):
+    if not search_enabled(schema_editor.connection):
+        return
+    schema_editor.execute(CREATE_SQL)
+    for sql in BACKFILL_SQL:
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if search_enabled(schema_editor.connection):
+        schema_editor.execute(DROP_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -24,6 +24,11 @@ class Group(models.Model):
         verbose_name='Описание группы',
         help_text='Введите описание',
     )
+    posts_count = models.PositiveIntegerField(
+        verbose_name='Число постов',
+        default=0,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = 'Группа'
@@ -41,6 +46,8 @@ class Post(CreatedModel):
         blank=True,
         null=True,
         on_delete=models.SET_NULL,
+        # Покрыт составным индексом post_group_pub_date
+        db_index=False,
         verbose_name='Группа',
         related_name='posts',
         help_text='Выберите группу из списка',
@@ -48,6 +55,8 @@ class Post(CreatedModel):
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
+        # Покрыт составным индексом post_author_pub_date
+        db_index=False,
         verbose_name='Автор',
         related_name='posts',
         help_text='Выберите автора из списка или создайте нового',
@@ -57,11 +66,24 @@ class Post(CreatedModel):
         upload_to='posts/',
         blank=True
     )
+    comments_count = models.PositiveIntegerField(
+        verbose_name='Число комментариев',
+        default=0,
+        editable=False,
+    )
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date'),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date'),
+        ]
 
     def __str__(self):
         return self.text[:settings.CHAR_LIMIT]
@@ -71,6 +93,8 @@ class Comment(CreatedModel):
     post = models.ForeignKey(
         Post,
         on_delete=models.CASCADE,
+        # Покрыт составным индексом comment_post_pub_date
+        db_index=False,
         blank=True,
         null=True,
         related_name='comments',
@@ -87,6 +111,11 @@ class Comment(CreatedModel):
         ordering = ('-pub_date',)
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(
+                fields=['post', '-pub_date', '-id'],
+                name='comment_post_pub_date'),
+        ]
 
     def __str__(self):
         return self.text[:settings.CHAR_LIMIT]
@@ -114,3 +143,33 @@ class Follow(models.Model):
             models.UniqueConstraint(
                 fields=['user', 'author'], name='unique_follow')
         ]
+
+
+class AuthorStats(models.Model):
+    """ Счётчики пользователя, поддерживаются сигналами """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь',
+    )
+    posts_count = models.PositiveIntegerField(
+        verbose_name='Число постов',
+        default=0,
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Число подписчиков',
+        default=0,
+    )
+    following_count = models.PositiveIntegerField(
+        verbose_name='Число подписок',
+        default=0,
+    )
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+    def __str__(self):
+        return f'{self.user}'
@@ -0,0 +1,164 @@
+import base64
+import binascii
+
+from django.db import connection
+
+from .models import Group, User
+from .utils import feed_posts
+
+SEARCH_TABLE = 'posts_search'
+POST, COMMENT = 'post', 'comment'
+
+CREATE_SQL = (
+    f'CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5('
+    'text, kind UNINDEXED, post_id UNINDEXED, author_id UNINDEXED, '
+    "tokenize='unicode61 remove_diacritics 2')"
+)
+BACKFILL_SQL = (
+    f'INSERT INTO {SEARCH_TABLE}(rowid, text, kind, post_id, author_id) '
+    "SELECT id * 2, text, 'post', id, author_id FROM posts_post",
+    f'INSERT INTO {SEARCH_TABLE}(rowid, text, kind, post_id, author_id) '
+    "SELECT id * 2 + 1, text, 'comment', post_id, author_id "
+    'FROM posts_comment WHERE post_id IS NOT NULL',
+)
+DROP_SQL = f'DROP TABLE IF EXISTS {SEARCH_TABLE}'
+
+
+def search_enabled(using=connection):
+    """ Индекс FTS5 есть только у SQLite. """
+    return using.vendor == 'sqlite'
+
+
+def _rowid(kind, pk):
+    # Посты и комментарии делят одну таблицу: чётные и нечётные rowid
+    return pk * 2 + (kind == COMMENT)
+
+
+def index_entry(kind, pk, text, post_id, author_id):
+    if not search_enabled():
+        return
+    rowid = _rowid(kind, pk)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s',
+                       [rowid])
+        cursor.execute(
+            f'INSERT INTO {SEARCH_TABLE}'
+            '(rowid, text, kind, post_id, author_id) '
+            'VALUES (%s, %s, %s, %s, %s)',
+            [rowid, text, kind, post_id, author_id],
+        )
+
+
+def index_new_rows(post_after, comment_after):
+    """ Индексирует посты и комментарии с id больше заданных.
+
+    Строки, уже проиндексированные сигналами, пропускаются.
+    """
+    if not search_enabled():
+        return
+    post_sql, comment_sql = BACKFILL_SQL
+    indexed = f'NOT EXISTS (SELECT 1 FROM {SEARCH_TABLE} WHERE rowid = %s)'
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'{post_sql} WHERE id > %s AND {indexed % "id * 2"}',
+            [post_after])
+        cursor.execute(
+            f'{comment_sql} AND id > %s AND {indexed % "id * 2 + 1"}',
+            [comment_after])
+
+
+def unindex_entry(kind, pk):
+    if not search_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s',
+                       [_rowid(kind, pk)])
+
+
+def build_match(query):
+    """ Экранирует запрос: каждое слово - отдельная фраза FTS5. """
+    words = query.split()
+    return ' '.join('"{}"'.format(word.replace('"', '""'))
+                    for word in words)
+
+
+def encode_cursor(rank, rowid):
+    raw = f'{rank!r}|{rowid}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        rank, rowid = base64.urlsafe_b64decode(
+            padded.encode()).decode().split('|')
+        return float(rank), int(rowid)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+def search(query, group_id=None, author_id=None, cursor=None, limit=10):
+    """ Ранжированный поиск по постам и комментариям.
+
+    Возвращает список совпадений (kind, post_id, snippet)
+    и курсор следующей страницы.
+    """
+    match = build_match(query)
+    if not match or not search_enabled():
+        return [], None
+    sql = [
+        f'SELECT s.rowid, s.kind, s.post_id, s.rank, '
+        f"snippet({SEARCH_TABLE}, 0, '[', ']', '…', 16) "
+        f'FROM {SEARCH_TABLE} AS s JOIN posts_post p ON p.id = s.post_id '
+        f'WHERE {SEARCH_TABLE} MATCH %s'
+    ]
+    params = [match]
+    if group_id is not None:
+        sql.append('AND p.group_id = %s')
+        params.append(group_id)
+    if author_id is not None:
+        sql.append('AND s.author_id = %s')
+        params.append(author_id)
+    position = decode_cursor(cursor) if cursor else None
+    if position is not None:
+        rank, rowid = position
+        sql.append('AND (s.rank > %s OR (s.rank = %s AND s.rowid > %s))')
+        params.extend([rank, rank, rowid])
+    sql.append('ORDER BY s.rank, s.rowid LIMIT %s')
+    params.append(limit + 1)
+    with connection.cursor() as db_cursor:
+        db_cursor.execute(' '.join(sql), params)
+        rows = db_cursor.fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][3], rows[-1][0])
+    hits = [(kind, post_id, snippet)
+            for _, kind, post_id, _, snippet in rows]
+    return hits, next_cursor
+
+
+def find_posts(query, group_slug='', author_username='', cursor=None,
+               limit=10):
+    """ Поиск с фильтрами по slug группы и имени автора.
+
+    Возвращает совпадения с подгруженными постами и курсор дальше.
+    """
+    group_id = author_id = None
+    if group_slug:
+        group_id = Group.objects.filter(slug=group_slug).values_list(
+            'pk', flat=True).first()
+        if group_id is None:
+            return [], None
+    if author_username:
+        author_id = User.objects.filter(
+            username=author_username).values_list('pk', flat=True).first()
+        if author_id is None:
+            return [], None
+    hits, next_cursor = search(query, group_id, author_id, cursor, limit)
+    posts = feed_posts().in_bulk({post_id for _, post_id, _ in hits})
+    results = [
+        {'kind': kind, 'post': posts[post_id], 'snippet': snippet}
+        for kind, post_id, snippet in hits if post_id in posts
+    ]
+    return results, next_cursor
@@ -0,0 +1,174 @@
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db.models import Max
+from django.utils import timezone
+
+from .cache import INDEX_FEED, bump_feed_versions, group_feed, profile_feed
+from .counters import recount_counters
+from .models import Comment, Follow, Group, Post, User
+from .search import index_new_rows
+from .timelines import forget_timelines
+
+BATCH_SIZE = 5000
+SEED_PASSWORD = 'seed-password'
+
+
+@contextmanager
+def explicit_pub_dates():
+    """ Позволяет bulk_create сохранить заданные даты публикации. """
+    fields = [
+        model._meta.get_field('pub_date') for model in (Post, Comment)
+    ]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def max_pk(model):
+    return model.objects.aggregate(Max('pk'))['pk__max'] or 0
+
+
+def refresh_after_bulk(post_after, comment_after, author_ids, group_ids,
+                       follower_ids=()):
+    """ Поиск и ленты после bulk_create, минуя сигналы.
+
+    post_after и comment_after - наибольшие id до загрузки; author_ids
+    и group_ids - чьи ленты она изменила, follower_ids - у кого
+    появились подписки.
+    """
+    index_new_rows(post_after, comment_after)
+    bump_feed_versions(
+        INDEX_FEED,
+        *(profile_feed(author_id) for author_id in author_ids),
+        *(group_feed(group_id) for group_id in group_ids),
+    )
+    if settings.FOLLOW_TIMELINES:
+        followers = set(follower_ids) | set(Follow.objects.filter(
+            author_id__in=author_ids).values_list('user_id', flat=True))
+        forget_timelines(followers, author_ids)
+
+
+class PowerLaw:
+    """ Выбор элементов с весами 1 / rank ** alpha (закон Ципфа). """
+
+    def __init__(self, items, alpha, rng):
+        self.items = list(items)
+        self.rng = rng
+        self.cum_weights = list(accumulate(
+            1 / (rank ** alpha) for rank in range(1, len(self.items) + 1)
+        ))
+
+    def sample(self, k):
+        return self.rng.choices(
+            self.items, cum_weights=self.cum_weights, k=k)
+
+
+def _batches(total, batch_size):
+    for start in range(0, total, batch_size):
+        yield min(batch_size, total - start)
+
+
+def seed(users=1000, groups=20, posts=10000, comments=20000, follows=20000,
+         alpha=1.2, days=365, batch_size=BATCH_SIZE, seed_value=0,
+         progress=None):
+    """ Заполняет БД синтетическими данными пакетными bulk_create.
+
+    Авторы постов, популярность подписок и комментируемых постов
+    распределены по степенному закону. Счётчики, поиск и кэши лент
+    обновляются в конце одним проходом.
+    """
+    rng = random.Random(seed_value)
+    progress = progress or (lambda model, done: None)
+    now = timezone.now()
+    post_after, comment_after = max_pk(Post), max_pk(Comment)
+    touched = set()
+    # Номера в именах идут от наибольшего pk: после удалений count()
+    # повторил бы занятые имена
+    start = offset = max_pk(User)
+    password = make_password(SEED_PASSWORD)
+    for size in _batches(users, batch_size):
+        User.objects.bulk_create(
+            User(username=f'user_{offset + i}', password=password)
+            for i in range(1, size + 1)
+        )
+        offset += size
+        progress(User, size)
+    user_ids = list(User.objects.filter(pk__gt=start).order_by(
+        'pk').values_list('pk', flat=True))
+    start = max_pk(Group)
+    Group.objects.bulk_create(
+        Group(title=f'Группа {i}', slug=f'group-{i}',
+              description=f'Описание группы {i}')
+        for i in range(start + 1, start + groups + 1)
+    )
+    progress(Group, groups)
+    group_ids = list(Group.objects.values_list('pk', flat=True))
+    authors = PowerLaw(user_ids, alpha, rng)
+    with explicit_pub_dates():
+        for size in _batches(posts, batch_size):
+            new_posts = [
+                Post(
+                    author_id=author_id,
+                    group_id=(rng.choice(group_ids)
+                              if group_ids and rng.random() < 0.7 else None),
+                    text=f'Синтетический пост {rng.random():.8f}',
+                    pub_date=now - timedelta(seconds=rng.uniform(
+                        0, days * 24 * 3600)),
+                )
+                for author_id in authors.sample(size)
+            ]
+            Post.objects.bulk_create(new_posts)
+            touched |= {(post.author_id, post.group_id) for post in new_posts}
+            progress(Post, size)
+        # Свежие посты комментируют чаще
+        recent = list(Post.objects.order_by('-pub_date').values_list(
+            'pk', 'author_id', 'group_id')[:posts])
+        commented = PowerLaw(recent, alpha, rng)
+        for size in _batches(comments, batch_size):
+            sample = commented.sample(size)
+            Comment.objects.bulk_create(
+                Comment(
+                    post_id=post_id,
+                    author_id=rng.choice(user_ids),
+                    text=f'Синтетический комментарий {rng.random():.8f}',
+                    pub_date=now - timedelta(seconds=rng.uniform(
+                        0, days * 24 * 3600)),
+                )
+                for post_id, _, _ in sample
+            )
+            touched |= {(author_id, group_id)
+                        for _, author_id, group_id in sample}
+            progress(Comment, size)
+    existing = set(Follow.objects.values_list('user_id', 'author_id'))
+    followers = set()
+    followed = PowerLaw(user_ids, alpha, rng)
+    for size in _batches(follows, batch_size):
+        pairs = set()
+        for author_id in followed.sample(size):
+            pair = (rng.choice(user_ids), author_id)
+            if pair[0] != pair[1] and pair not in existing:
+                pairs.add(pair)
+        existing |= pairs
+        followers |= {user_id for user_id, _ in pairs}
+        Follow.objects.bulk_create(
+            Follow(user_id=user_id, author_id=author_id)
+            for user_id, author_id in pairs
+        )
+        progress(Follow, len(pairs))
+    recount_counters()
+    refresh_after_bulk(
+        post_after, comment_after,
+        {author_id for author_id, _ in touched},
+        {group_id for _, group_id in touched if group_id},
+        followers,
+    )
+    return user_ids
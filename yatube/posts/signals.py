@@ -0,0 +1,234 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .cache import (INDEX_FEED, bump_feed_versions, group_feed,
+                    post_feeds, profile_feed)
+from .counters import change_author_stats, change_counters
+from .models import Comment, Follow, Group, Post, User
+from .search import COMMENT, POST, index_entry, unindex_entry
+from .syndication import forget_feed_names
+from . import timelines
+
+# Поля автора, которые видны в карточках постов
+AUTHOR_NAME_FIELDS = ('username', 'first_name', 'last_name')
+
+
+@receiver(pre_save, sender=Post)
+def remember_old_post(sender, instance, raw, **kwargs):
+    """ Запоминает автора и группу поста до редактирования. """
+    instance._old_post = None
+    if raw or instance.pk is None:
+        return
+    instance._old_post = Post.objects.filter(pk=instance.pk).only(
+        'author_id', 'group_id').first()
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_feeds(sender, instance, **kwargs):
+    old = getattr(instance, '_old_post', None)
+    old_feeds = post_feeds(old) if old is not None else []
+    bump_feed_versions(*post_feeds(instance), *old_feeds)
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    old_author_id = old_group_id = None
+    if not created:
+        old = getattr(instance, '_old_post', None)
+        if old is None:
+            return
+        old_author_id, old_group_id = old.author_id, old.group_id
+    if old_author_id != instance.author_id:
+        if old_author_id:
+            change_author_stats(old_author_id, posts_count=-1)
+        change_author_stats(instance.author_id, posts_count=1)
+    if old_group_id == instance.group_id:
+        return
+    if old_group_id:
+        change_counters(
+            Group.objects.filter(pk=old_group_id), posts_count=-1)
+    if instance.group_id:
+        change_counters(
+            Group.objects.filter(pk=instance.group_id), posts_count=1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    change_author_stats(instance.author_id, posts_count=-1)
+    if instance.group_id:
+        change_counters(
+            Group.objects.filter(pk=instance.group_id), posts_count=-1)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, raw, **kwargs):
+    if settings.FOLLOW_TIMELINES and created and not raw:
+        timelines.push_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def remove_post_from_timelines(sender, instance, **kwargs):
+    if settings.FOLLOW_TIMELINES:
+        timelines.remove_post(instance)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, raw, **kwargs):
+    if not raw:
+        index_entry(POST, instance.pk, instance.text, instance.pk,
+                    instance.author_id)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    unindex_entry(POST, instance.pk)
+
+
+@receiver(pre_save, sender=Comment)
+def remember_old_comment(sender, instance, raw, **kwargs):
+    """ Запоминает пост комментария до редактирования. """
+    instance._old_comment = None
+    if raw or instance.pk is None:
+        return
+    instance._old_comment = Comment.objects.filter(pk=instance.pk).only(
+        'post_id').first()
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_feeds(sender, instance, **kwargs):
+    old = getattr(instance, '_old_comment', None)
+    post_ids = {instance.post_id, old.post_id if old is not None else None}
+    posts = Post.objects.filter(pk__in=post_ids - {None}).only(
+        'author_id', 'group_id')
+    bump_feed_versions(
+        *(feed for post in posts for feed in post_feeds(post)),
+        syndication=False)
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    old_post_id = None
+    if not created:
+        old = getattr(instance, '_old_comment', None)
+        if old is None:
+            return
+        old_post_id = old.post_id
+    if old_post_id == instance.post_id:
+        return
+    if old_post_id:
+        change_counters(
+            Post.objects.filter(pk=old_post_id), comments_count=-1)
+    if instance.post_id:
+        change_counters(
+            Post.objects.filter(pk=instance.post_id), comments_count=1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    change_counters(
+        Post.objects.filter(pk=instance.post_id), comments_count=-1)
+
+
+@receiver(post_save, sender=Comment)
+def index_comment(sender, instance, raw, **kwargs):
+    if not raw and instance.post_id:
+        index_entry(COMMENT, instance.pk, instance.text, instance.post_id,
+                    instance.author_id)
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_comment(sender, instance, **kwargs):
+    unindex_entry(COMMENT, instance.pk)
+
+
+@receiver(post_save, sender=Follow)
+def count_saved_follow(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        change_author_stats(instance.author_id, followers_count=1)
+        change_author_stats(instance.user_id, following_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    change_author_stats(instance.author_id, followers_count=-1)
+    change_author_stats(instance.user_id, following_count=-1)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, raw, **kwargs):
+    if settings.FOLLOW_TIMELINES and created and not raw:
+        timelines.forget_if_limit_crossed(instance.author_id, 1)
+        timelines.backfill_author(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    if settings.FOLLOW_TIMELINES:
+        timelines.forget_if_limit_crossed(instance.author_id, -1)
+        timelines.prune_author(instance.user_id, instance.author_id)
+
+
+@receiver(pre_save, sender=Group)
+def remember_old_slug(sender, instance, raw, **kwargs):
+    instance._old_slug = None
+    if raw or instance.pk is None:
+        return
+    instance._old_slug = Group.objects.filter(pk=instance.pk).values_list(
+        'slug', flat=True).first()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_feeds(sender, instance, **kwargs):
+    bump_feed_versions(INDEX_FEED, group_feed(instance.pk))
+    # Старый адрес ленты мог достаться другой группе
+    forget_feed_names(
+        'group', instance.slug, getattr(instance, '_old_slug', None))
+
+
+@receiver(pre_save, sender=User)
+def remember_old_name(sender, instance, raw, update_fields, **kwargs):
+    """ Запоминает имя автора до сохранения (но не при входе). """
+    instance._old_name = None
+    if raw or instance.pk is None:
+        return
+    if update_fields is not None and not (
+            set(update_fields) & set(AUTHOR_NAME_FIELDS)):
+        return
+    instance._old_name = User.objects.filter(pk=instance.pk).values_list(
+        *AUTHOR_NAME_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_feeds(sender, instance, **kwargs):
+    old = getattr(instance, '_old_name', None)
+    new = tuple(getattr(instance, field) for field in AUTHOR_NAME_FIELDS)
+    if old is None or old == new:
+        return
+    group_ids = list(Post.objects.filter(author=instance).order_by(
+    ).values_list('group_id', flat=True).distinct())
+    if group_ids:
+        bump_feed_versions(
+            INDEX_FEED, profile_feed(instance.pk),
+            *(group_feed(group_id) for group_id in group_ids if group_id))
+
+
+@receiver(post_save, sender=User)
+def forget_author_feed_name(sender, instance, created, raw, **kwargs):
+    old = getattr(instance, '_old_name', None)
+    old_username = old[0] if old is not None else None
+    if created or old_username not in (None, instance.username):
+        # Старый адрес ленты мог достаться другому пользователю
+        forget_feed_names('author', instance.username, old_username)
+
+
+@receiver(post_delete, sender=User)
+def forget_deleted_author_feed_name(sender, instance, **kwargs):
+    forget_feed_names('author', instance.username)
@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.contrib.sitemaps import Sitemap
+from django.db.models import Count, F, Max, Sum
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Group, Post, User
+
+INDEX_FILE = 'sitemap.xml'
+MANIFEST_FILE = 'manifest.json'
+
+
+def chunk_of(pk):
+    """ Номер файла карты: объекты режутся на куски по диапазонам pk. """
+    return pk // settings.SITEMAP_CHUNK_SIZE
+
+
+def chunk_file(section, chunk):
+    return f'{section}-{chunk}.xml'
+
+
+class ChunkSitemap(Sitemap):
+    """ Один кусок карты: объекты с pk из диапазона куска. """
+    model = None
+    # Поля, от которых кроме pk зависят адрес и lastmod записи
+    fingerprint_fields = ()
+    # Кусок целиком - одна страница (SITEMAP_CHUNK_SIZE не больше)
+    limit = 50000
+
+    def __init__(self, chunk=None):
+        self.chunk = chunk
+
+    def fingerprints(self):
+        """ Отпечатки кусков по данным их записей в карте. """
+        digests = {}
+        rows = self.queryset().order_by('pk').values_list(
+            'pk', *self.fingerprint_fields)
+        for row in rows.iterator():
+            digests.setdefault(
+                chunk_of(row[0]), hashlib.md5()).update(repr(row).encode())
+        return {chunk: digest.hexdigest() for chunk, digest in digests.items()}
+
+    def queryset(self):
+        return self.model.objects.all()
+
+    def items(self):
+        start = self.chunk * settings.SITEMAP_CHUNK_SIZE
+        return self.queryset().filter(
+            pk__gte=start, pk__lt=start + settings.SITEMAP_CHUNK_SIZE,
+        ).order_by('pk')
+
+    def lastmod(self, item):
+        return item.lastmod
+
+
+class PostSitemap(ChunkSitemap):
+    model = Post
+
+    def queryset(self):
+        return Post.objects.only('pub_date')
+
+    def fingerprints(self):
+        # Адрес - pk, lastmod - неизменная дата публикации: хватает
+        # агрегатов по куску, без чтения всех постов
+        rows = Post.objects.annotate(
+            chunk=F('pk') / settings.SITEMAP_CHUNK_SIZE,
+        ).values('chunk').annotate(
+            count=Count('pk'), pk_sum=Sum('pk'), last=Max('pub_date'),
+        ).order_by()
+        return {
+            row['chunk']:
+                f"{row['count']}:{row['pk_sum']}:{row['last'].isoformat()}"
+            for row in rows
+        }
+
+    def location(self, post):
+        return reverse('posts:post_detail', args=(post.pk,))
+
+    def lastmod(self, post):
+        return post.pub_date
+
+
+class GroupSitemap(ChunkSitemap):
+    model = Group
+    fingerprint_fields = ('slug', 'lastmod')
+
+    def queryset(self):
+        return Group.objects.only('slug').annotate(
+            lastmod=Max('posts__pub_date'))
+
+    def location(self, group):
+        return reverse('posts:group_list', args=(group.slug,))
+
+
+class AuthorSitemap(ChunkSitemap):
+    """ Профили пользователей, у которых есть посты. """
+    model = User
+    fingerprint_fields = ('username', 'lastmod')
+
+    def queryset(self):
+        return User.objects.filter(stats__posts_count__gt=0).only(
+            'username').annotate(lastmod=Max('posts__pub_date'))
+
+    def location(self, author):
+        return reverse('posts:profile', args=(author.username,))
+
+
+SITEMAPS = {
+    'posts': PostSitemap,
+    'groups': GroupSitemap,
+    'authors': AuthorSitemap,
+}
+
+
+def _read_manifest(root):
+    """ Файл куска -> время записи и отпечаток собранных данных. """
+    try:
+        with open(os.path.join(root, MANIFEST_FILE)) as manifest:
+            manifest = json.load(manifest)
+    except FileNotFoundError:
+        return {}
+    # В старом формате был только lastmod: такие куски пересобираются
+    return {
+        name: entry if isinstance(entry, dict) else {
+            'lastmod': entry, 'fingerprint': None}
+        for name, entry in manifest.items()
+    }
+
+
+def _write(path, content):
+    # Краулер не должен увидеть недописанный файл
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w', encoding='utf-8') as output:
+        output.write(content)
+    os.replace(temporary, path)
+
+
+def _chunks_to_build(section, manifest, full):
+    """ Куски, чей отпечаток в БД разошёлся с манифестом, и отпечатки.
+
+    Отпечатки считаются по данным в БД, а не по меткам из сигналов:
+    их видит любой процесс, и bulk-записи их тоже меняют.
+    """
+    fingerprints = SITEMAPS[section]().fingerprints()
+    written = {
+        int(name[len(section) + 1:-len('.xml')]): entry['fingerprint']
+        for name, entry in manifest.items() if name.startswith(f'{section}-')
+    }
+    candidates = fingerprints.keys() | written.keys()
+    if not full:
+        candidates = {
+            chunk for chunk in candidates
+            if fingerprints.get(chunk) != written.get(chunk)
+        }
+    return candidates, fingerprints
+
+
+def write_sitemaps(domain, protocol='https', full=False):
+    """ Пересобирает на диске изменившиеся куски карты сайта и индекс.
+
+    Собираются куски, чей отпечаток не совпал с записанным в манифесте;
+    full - все куски. Возвращает имена записанных и удалённых файлов.
+    """
+    root = settings.SITEMAP_ROOT
+    os.makedirs(root, exist_ok=True)
+    manifest = _read_manifest(root)
+    site = SimpleNamespace(domain=domain)
+    changed = []
+    for section, sitemap_class in SITEMAPS.items():
+        # Отпечатки снимаются до сборки: правка во время сборки
+        # разойдётся с манифестом и попадёт в следующий запуск
+        chunks, fingerprints = _chunks_to_build(section, manifest, full)
+        for chunk in sorted(chunks):
+            name = chunk_file(section, chunk)
+            path = os.path.join(root, name)
+            urls = sitemap_class(chunk).get_urls(site=site, protocol=protocol)
+            if urls:
+                _write(path, render_to_string(
+                    'sitemap.xml', {'urlset': urls}))
+                manifest[name] = {
+                    'lastmod': timezone.now().isoformat(),
+                    'fingerprint': fingerprints.get(chunk),
+                }
+            elif name in manifest or os.path.exists(path):
+                # Все объекты куска удалены
+                if os.path.exists(path):
+                    os.remove(path)
+                manifest.pop(name, None)
+            else:
+                continue
+            changed.append(name)
+    if changed or not os.path.exists(os.path.join(root, INDEX_FILE)):
+        base = f'{protocol}://{domain}{settings.SITEMAP_URL}'
+        _write(os.path.join(root, INDEX_FILE), render_to_string(
+            'posts/sitemap_index.xml', {'sitemaps': [
+                {'location': base + name, 'lastmod': entry['lastmod']}
+                for name, entry in sorted(manifest.items())
+            ]}))
+        _write(os.path.join(root, MANIFEST_FILE), json.dumps(manifest))
+    return changed
@@ -0,0 +1,171 @@
+import hashlib
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.contrib.syndication.views import Feed
+from django.http import Http404, HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.feedgenerator import Atom1Feed, Rss201rev2Feed
+from django.utils.http import http_date, quote_etag
+
+from core.cache import NamespacedCache, start_tracking_stale
+from core.db import read_from_replicas
+
+from .cache import (INDEX_FEED, get_feed_modified, get_feed_version,
+                    group_feed, profile_feed, syndicated_feed)
+from .conditional import drop_stale_validators, record_conditional
+from .models import Group, User
+from .utils import feed_posts
+
+SYNDICATION_FORMATS = {'rss': Rss201rev2Feed, 'atom': Atom1Feed}
+FEED_NAME_KEY = 'feed_name:{}:{}'
+RENDERED_KEY = 'rendered:{}:{}:{}'
+
+syndication_cache = NamespacedCache('posts:syndication')
+
+
+class LatestPostsFeed(Feed):
+    """ Последние посты всех авторов. """
+    title = 'Yatube: последние посты'
+    description = subtitle = 'Новые посты всех авторов Yatube'
+
+    def __init__(self, feed_format='rss'):
+        super().__init__()
+        self.feed_type = SYNDICATION_FORMATS[feed_format]
+
+    def link(self):
+        return reverse('posts:index')
+
+    def items(self):
+        return feed_posts()[:settings.SYNDICATION_ITEMS]
+
+    def item_title(self, post):
+        return str(post)
+
+    def item_description(self, post):
+        return post.text
+
+    def item_link(self, post):
+        return reverse('posts:post_detail', args=(post.pk,))
+
+    def item_pubdate(self, post):
+        return post.pub_date
+
+    def item_author_name(self, post):
+        return post.author.get_full_name() or post.author.username
+
+    def item_categories(self, post):
+        return [post.group.title] if post.group_id else []
+
+
+class GroupPostsFeed(LatestPostsFeed):
+    """ Последние посты группы. """
+
+    def get_object(self, request, slug):
+        return get_object_or_404(Group, slug=slug)
+
+    def title(self, group):
+        return f'Yatube: {group.title}'
+
+    def description(self, group):
+        return group.description
+
+    subtitle = description
+
+    def link(self, group):
+        return reverse('posts:group_list', args=(group.slug,))
+
+    def items(self, group):
+        return feed_posts(group.posts.all())[:settings.SYNDICATION_ITEMS]
+
+
+class AuthorPostsFeed(LatestPostsFeed):
+    """ Последние посты автора. """
+
+    def get_object(self, request, username):
+        return get_object_or_404(User, username=username)
+
+    def title(self, author):
+        return f'Yatube: посты {author.get_full_name() or author.username}'
+
+    def description(self, author):
+        return f'Новые посты пользователя {author.username}'
+
+    subtitle = description
+
+    def link(self, author):
+        return reverse('posts:profile', args=(author.username,))
+
+    def items(self, author):
+        return feed_posts(author.posts.all())[:settings.SYNDICATION_ITEMS]
+
+
+# Вид ленты -> (класс, модель и поле для поиска владельца, имя в кэше)
+FEEDS = {
+    'index': (LatestPostsFeed, None, None, None),
+    'group': (GroupPostsFeed, Group, 'slug', group_feed),
+    'author': (AuthorPostsFeed, User, 'username', profile_feed),
+}
+
+
+def feed_name(kind, key=None):
+    """ Имя версии RSS и Atom ленты; владелец ищется в БД один раз. """
+    _, model, field, name_func = FEEDS[kind]
+    if model is None:
+        return syndicated_feed(INDEX_FEED)
+    cache_key = FEED_NAME_KEY.format(kind, key)
+    name = syndication_cache.get(cache_key)
+    if name is None:
+        pk = model.objects.filter(**{field: key}).values_list(
+            'pk', flat=True).first()
+        if pk is None:
+            raise Http404
+        name = syndicated_feed(name_func(pk))
+        syndication_cache.set(
+            cache_key, name, settings.SYNDICATION_CACHE_TIMEOUT)
+    return name
+
+
+def forget_feed_names(kind, *keys):
+    """ Сбрасывает имена лент переименованных и удалённых владельцев. """
+    syndication_cache.delete_many(
+        [FEED_NAME_KEY.format(kind, key) for key in keys if key])
+
+
+def feed_changed_at(request, kind, feed_format, key=None):
+    return datetime.fromtimestamp(
+        get_feed_modified(feed_name(kind, key)), timezone.utc)
+
+
+@read_from_replicas(changed_at=feed_changed_at)
+def syndication_feed(request, kind, feed_format, key=None):
+    """ RSS или Atom из кэша: рендер один раз на версию ленты.
+
+    Опрос без изменений стоит нескольких чтений кэша и отвечает 304.
+    """
+    start_tracking_stale()
+    feed = feed_name(kind, key)
+    version = get_feed_version(feed)
+    etag = quote_etag(hashlib.md5(
+        f'{feed_format}:{version}'.encode()).hexdigest())
+    last_modified = get_feed_modified(feed)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified)
+    record_conditional('syndication', response is not None)
+    if response is None:
+
+        def render():
+            args = () if key is None else (key,)
+            rendered = FEEDS[kind][0](feed_format)(request, *args)
+            return rendered['Content-Type'], rendered.content
+
+        content_type, content = syndication_cache.get_or_compute(
+            RENDERED_KEY.format(
+                feed, feed_format, request.build_absolute_uri('/')),
+            render, settings.SYNDICATION_CACHE_TIMEOUT, version=version)
+        response = HttpResponse(content, content_type=content_type)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return drop_stale_validators(response)
@@ -0,0 +1,10 @@
+from django import template
+
+from ..thumbnails import ready_thumbnail_url
+
+register = template.Library()
+
+
+@register.simple_tag
+def ready_thumbnail(post, geometry):
+    return ready_thumbnail_url(post, geometry)
@@ -0,0 +1,123 @@
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, User
+
+
+@override_settings(POSTS_PER_PAGE=5, COMMENTS_PER_PAGE=2)
+class ApiViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='auth')
+        cls.reader = User.objects.create(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, group=cls.group if i % 2 else None,
+                text=f'Тестовый пост {i}')
+            for i in range(7)
+        ]
+        cls.post = cls.posts[-1]
+        for i in range(3):
+            Comment.objects.create(
+                post=cls.post, author=cls.reader, text=f'Комментарий {i}')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def walk(self, client, url, **params):
+        ids, cursor = [], ''
+        while cursor is not None:
+            data = client.get(url, {**params, 'cursor': cursor}).json()
+            ids += [item['id'] for item in data['results']]
+            cursor = data['next_cursor']
+        return ids
+
+    def test_feeds_walk_by_cursor(self):
+        """Ленты API отдаются целиком по курсору, новые сверху"""
+        newest_first = [post.pk for post in reversed(self.posts)]
+        feeds = (
+            (self.guest_client, reverse('posts:api_posts'), newest_first),
+            (self.guest_client,
+             reverse('posts:api_group_posts', args=(self.group.slug,)),
+             [post.pk for post in reversed(self.posts) if post.group_id]),
+            (self.guest_client,
+             reverse('posts:api_author_posts', args=(self.author,)),
+             newest_first),
+            (self.authorized_client, reverse('posts:api_follow'),
+             newest_first),
+        )
+        for client, url, expected in feeds:
+            with self.subTest(url=url):
+                self.assertEqual(self.walk(client, url), expected)
+        self.assertEqual(
+            self.walk(self.guest_client, reverse('posts:api_posts'),
+                      limit=2),
+            newest_first)
+
+    def test_fields_selection(self):
+        """Отдаются только запрошенные поля, лишние - ошибка"""
+        url = reverse('posts:api_posts')
+        with self.assertNumQueries(1):
+            data = self.guest_client.get(
+                url, {'fields': 'id,author,group'}).json()
+        self.assertEqual(
+            data['results'][0],
+            {'id': self.post.pk, 'author': 'auth', 'group': None},
+        )
+        response = self.guest_client.get(url, {'fields': 'id,password'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.json()['error'])
+
+    def test_post_detail_with_comments(self):
+        """Пост отдаётся с первой страницей комментариев"""
+        data = self.guest_client.get(
+            reverse('posts:api_post_detail', args=(self.post.pk,))).json()
+        self.assertEqual(data['text'], self.post.text)
+        self.assertEqual(data['comments_count'], 3)
+        self.assertEqual(
+            [comment['text'] for comment in data['comments']],
+            ['Комментарий 2', 'Комментарий 1'])
+        rest = self.guest_client.get(
+            reverse('posts:api_post_comments', args=(self.post.pk,)),
+            {'cursor': data['comments_next_cursor']},
+        ).json()
+        self.assertEqual(
+            [comment['text'] for comment in rest['results']],
+            ['Комментарий 0'])
+        self.assertIsNone(rest['next_cursor'])
+
+    def test_errors(self):
+        """Ошибки API - JSON с кодом ответа"""
+        cases = (
+            (self.guest_client, reverse('posts:api_follow'), 401),
+            (self.guest_client,
+             reverse('posts:api_post_detail', args=(0,)), 404),
+            (self.guest_client,
+             reverse('posts:api_group_posts', args=('missing',)), 404),
+            (self.guest_client,
+             reverse('posts:api_author_posts', args=('missing',)), 404),
+        )
+        for client, url, status in cases:
+            with self.subTest(url=url):
+                response = client.get(url)
+                self.assertEqual(response.status_code, status)
+                self.assertIn('error', response.json())
+
+    def test_groups_list(self):
+        """Список групп со счётчиком постов"""
+        data = self.guest_client.get(reverse('posts:api_groups')).json()
+        self.assertEqual(data['results'], [{
+            'slug': 'test-slug',
+            'title': 'Тестовая группа',
+            'description': 'Тестовое описание',
+            'posts_count': 3,
+        }])
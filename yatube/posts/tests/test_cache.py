@@ -0,0 +1,165 @@
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.cache.backends.db import DatabaseCache
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from core.cache import (NamespacedCache, cache_stats, reset_cache_stats,
+                        served_stale, start_tracking_stale)
+from core.db import (ReplicaRouter, start_tracking_writes, use_replicas,
+                     wrote_in_request)
+
+from ..models import Post, User
+
+
+class NamespacedCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_cache_stats()
+
+    def test_namespaces_and_stats(self):
+        """Пространства имён не пересекаются и считаются отдельно"""
+        first = NamespacedCache('test:first')
+        second = NamespacedCache('test:second')
+        first.set('key', 1)
+        self.assertEqual(first.get('key'), 1)
+        self.assertIsNone(second.get('key'))
+        self.assertEqual(second.get_many(['key', 'other']), {})
+        first.add('counter', 0)
+        first.incr('counter')
+        self.assertEqual(first.get_many(['key', 'counter']),
+                         {'key': 1, 'counter': 1})
+        stats = cache_stats()
+        self.assertEqual(
+            stats['test:first'],
+            {'hits': 3, 'misses': 0, 'hit_rate': 1.0},
+        )
+        self.assertEqual(
+            stats['test:second'],
+            {'hits': 0, 'misses': 3, 'hit_rate': 0.0},
+        )
+
+    def test_feed_caches_counted(self):
+        """Кэши лент и карточек видны в статистике"""
+        author = User.objects.create(username='auth')
+        Post.objects.create(author=author, text='Тестовый пост')
+        Client().get(reverse('posts:index'))
+        stats = cache_stats()
+        self.assertIn('posts:feeds', stats)
+        self.assertIn('posts:cards', stats)
+
+    def test_file_profile_shared_between_instances(self):
+        """Файловый кэш общий: запись из другого экземпляра бэкенда видна"""
+        with tempfile.TemporaryDirectory() as location:
+            profile = {
+                'default': {
+                    'BACKEND': (
+                        'django.core.cache.backends.filebased.'
+                        'FileBasedCache'),
+                    'LOCATION': location,
+                },
+            }
+            with override_settings(CACHES=profile):
+                feeds = NamespacedCache('test:feeds')
+                # Экземпляры бэкендов свои у каждого потока,
+                # как и у каждого процесса
+                writer = threading.Thread(
+                    target=feeds.set, args=('version', 42))
+                writer.start()
+                writer.join()
+                self.assertEqual(feeds.get('version'), 42)
+                self.assertTrue(os.listdir(location))
+
+
+class SingleFlightCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.cache = NamespacedCache('test:flight')
+        self.calls = []
+
+    def compute(self, value='готово', delay=0):
+        def compute():
+            self.calls.append(value)
+            time.sleep(delay)
+            return value
+        return compute
+
+    def test_value_computed_once(self):
+        """Значение считается один раз и берётся из кэша"""
+        for _ in range(3):
+            self.assertEqual(
+                self.cache.get_or_compute('key', self.compute(), 60),
+                'готово')
+        self.assertEqual(self.calls, ['готово'])
+
+    def test_concurrent_misses_compute_once(self):
+        """Одновременные промахи пересчитывает один поток"""
+        results = []
+
+        def worker():
+            results.append(self.cache.get_or_compute(
+                'key', self.compute(delay=0.2), 60))
+
+        threads = [threading.Thread(target=worker) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['готово'] * 5)
+        self.assertEqual(self.calls, ['готово'])
+
+    def test_stale_value_served_while_locked(self):
+        """Пока другой пересчитывает, отдаётся прежняя версия"""
+        self.cache.get_or_compute('key', self.compute('старое'), 60, 1)
+        self.cache.add('key:lock', True)
+        start_tracking_stale()
+        self.assertEqual(
+            self.cache.get_or_compute('key', self.compute('новое'), 60, 2),
+            'старое')
+        self.assertTrue(served_stale())
+        self.cache.delete('key:lock')
+        start_tracking_stale()
+        self.assertEqual(
+            self.cache.get_or_compute('key', self.compute('новое'), 60, 2),
+            'новое')
+        self.assertEqual(self.calls, ['старое', 'новое'])
+        self.assertFalse(served_stale())
+
+    @override_settings(CACHE_LOCK_WAIT=0)
+    def test_compute_when_lock_holder_is_slow(self):
+        """Без значения и без дождавшегося результата считаем сами"""
+        self.cache.add('key:lock', True)
+        self.assertEqual(
+            self.cache.get_or_compute('key', self.compute(), 60), 'готово')
+
+    def test_early_expiration(self):
+        """Долгий пересчёт начинается до срока"""
+        self.cache.set('key', ('старое', None, time.time() + 10, 100))
+        with mock.patch('core.cache.random.random', return_value=0.5):
+            self.assertEqual(
+                self.cache.get_or_compute('key', self.compute(), 60),
+                'готово')
+        self.cache.set('key', ('старое', None, time.time() + 10, 0.001))
+        with mock.patch('core.cache.random.random', return_value=0.5):
+            self.assertEqual(
+                self.cache.get_or_compute('key', self.compute(), 60),
+                'старое')
+
+
+class DatabaseCacheRoutingTest(SimpleTestCase):
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_database_cache_stays_on_primary(self):
+        """Кэш в БД читается и пишется в основной БД и не считается
+        записью пользователя"""
+        model = DatabaseCache('yatube_cache', {}).cache_model_class
+        router = ReplicaRouter()
+        start_tracking_writes()
+        with use_replicas():
+            self.assertEqual(router.db_for_read(model), 'default')
+            self.assertEqual(router.db_for_write(model), 'default')
+        self.assertFalse(wrote_in_request())
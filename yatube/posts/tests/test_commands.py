@@ -0,0 +1,397 @@
+import csv
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.db.models import Count, F
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from ..cache import INDEX_FEED, get_feed_version
+from ..management.commands.benchmark import find_regressions, percentile
+from ..management.commands.check_query_plans import plan_problems
+from ..models import AuthorStats, Comment, Follow, Group, Post, User
+from ..search import search
+from ..sitemaps import INDEX_FILE
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+class GenerateDataCommandTest(TestCase):
+    def test_generate_data(self):
+        """generate_data создаёт данные со степенным распределением"""
+        call_command(
+            'generate_data', users=50, groups=3, posts=500, comments=300,
+            follows=300, batch_size=100, stdout=StringIO(),
+        )
+        self.assertEqual(User.objects.count(), 50)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Post.objects.count(), 500)
+        self.assertEqual(Comment.objects.count(), 300)
+        self.assertFalse(
+            Follow.objects.filter(user_id=F('author_id')).exists())
+        per_author = sorted(
+            Post.objects.order_by().values('author')
+            .annotate(total=Count('pk'))
+            .values_list('total', flat=True),
+            reverse=True,
+        )
+        median = per_author[len(per_author) // 2]
+        self.assertGreater(per_author[0], 5 * median)
+        top = AuthorStats.objects.order_by('-posts_count').first()
+        self.assertEqual(top.posts_count, per_author[0])
+        self.assertEqual(
+            sum(AuthorStats.objects.values_list(
+                'followers_count', flat=True)),
+            Follow.objects.count(),
+        )
+
+    def test_generated_data_searchable(self):
+        """Сгенерированные посты попадают в поиск, ленты сбрасываются"""
+        version = get_feed_version(INDEX_FEED)
+        call_command(
+            'generate_data', users=10, groups=2, posts=50, comments=20,
+            follows=10, stdout=StringIO(),
+        )
+        self.assertNotEqual(get_feed_version(INDEX_FEED), version)
+        if connection.vendor == 'sqlite':
+            hits, _ = search('Синтетический', limit=100)
+            kinds = {kind for kind, _, _ in hits}
+            self.assertEqual(kinds, {'post', 'comment'})
+
+    def test_repeated_run_after_deletions(self):
+        """Повторный запуск после удалений не занимает существующие имена"""
+        options = dict(users=5, groups=2, posts=10, comments=5, follows=5,
+                       stdout=StringIO())
+        call_command('generate_data', **options)
+        User.objects.order_by('pk').first().delete()
+        Group.objects.order_by('pk').first().delete()
+        call_command('generate_data', **options)
+        self.assertEqual(User.objects.count(), 9)
+        self.assertEqual(Group.objects.count(), 3)
+
+
+class BenchmarkCommandTest(TestCase):
+    def test_percentile(self):
+        """Перцентиль по ближайшему рангу"""
+        values = list(range(100, 0, -1))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile(values, 100), 100)
+        self.assertEqual(percentile([7], 99), 7)
+
+    def test_find_regressions(self):
+        """Регрессия - рост p95 сверх допуска или рост числа запросов"""
+        baseline = {
+            'index': {'p95_ms': 100, 'queries_max': 5},
+            'profile': {'p95_ms': 2, 'queries_max': 5},
+        }
+        ok = {
+            'index': {'p95_ms': 120, 'queries_max': 5},
+            # Рост меньше slack_ms на быстрой странице допустим
+            'profile': {'p95_ms': 6, 'queries_max': 4},
+        }
+        self.assertEqual(find_regressions(ok, baseline, 0.25, 5), [])
+        slow = {
+            'index': {'p95_ms': 130, 'queries_max': 6},
+            'profile': {'p95_ms': 8, 'queries_max': 5},
+        }
+        self.assertEqual(len(find_regressions(slow, baseline, 0.25, 5)), 3)
+
+    def test_missing_baseline(self):
+        """Без сохранённой базы прогон завершается ошибкой"""
+        with self.assertRaisesMessage(CommandError, 'не найдена'):
+            call_command(
+                'benchmark', baseline='/nonexistent/baseline.json',
+                stdout=StringIO())
+
+
+class SqlitePragmasTest(SimpleTestCase):
+    @override_settings(SQLITE_PRAGMAS=settings.SQLITE_PROFILES['tuned'])
+    def test_connection_uses_profile_pragmas(self):
+        """Новое соединение получает прагмы профиля tuned"""
+        if connection.vendor != 'sqlite':
+            self.skipTest('Прагмы есть только у SQLite')
+        # Своё соединение: прагмы ставятся при подключении
+        tuned = connections['default'].__class__(
+            {**connection.settings_dict, 'NAME': ':memory:'}, 'pragmas')
+        self.addCleanup(tuned.close)
+        with tuned.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            # 1 - NORMAL
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+
+
+class CheckQueryPlansCommandTest(TestCase):
+    def test_hot_queries_use_indexes(self):
+        """Запросы страниц идут по индексам без временной сортировки"""
+        call_command('check_query_plans', stdout=StringIO())
+
+    def test_plan_problems(self):
+        """Сканирование таблицы и временное B-дерево считаются проблемой"""
+        self.assertEqual(
+            len(plan_problems(
+                '2 0 0 SCAN posts_post\n'
+                '9 0 0 USE TEMP B-TREE FOR ORDER BY', False)), 2)
+        self.assertEqual(plan_problems(
+            '7 0 0 SCAN posts_post USING INDEX posts_post_pub_date\n'
+            '9 0 0 USE TEMP B-TREE FOR ORDER BY', True), [])
+
+
+class ExportDataCommandTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, group=cls.group if i % 2 else None,
+                text=f'Тестовый пост {i}')
+            for i in range(5)
+        ]
+        Comment.objects.create(
+            post=cls.posts[0], author=cls.author, text='Комментарий')
+
+    def export(self, *args, **options):
+        out = StringIO()
+        call_command('export_data', *args, stdout=out, **options)
+        return out.getvalue()
+
+    def test_ndjson(self):
+        """Посты выгружаются построчно в NDJSON"""
+        rows = [json.loads(line) for line in
+                self.export('posts', group='test-slug').splitlines()]
+        self.assertEqual(
+            [row['id'] for row in rows],
+            [post.pk for post in self.posts if post.group_id])
+        self.assertEqual(rows[0]['author'], 'auth')
+        self.assertEqual(rows[0]['group'], 'test-slug')
+
+    def test_csv(self):
+        """Комментарии выгружаются в CSV с заголовком"""
+        rows = list(csv.reader(StringIO(
+            self.export('comments', format='csv', since='2000-01-01'))))
+        self.assertEqual(
+            rows[0], ['id', 'text', 'pub_date', 'author', 'post'])
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][1], 'Комментарий')
+        self.assertEqual(
+            self.export('comments', format='csv', until='2000-01-01'),
+            'id,text,pub_date,author,post\r\n')
+
+    def test_bad_date(self):
+        """Неверная дата - ошибка команды"""
+        with self.assertRaises(CommandError):
+            self.export('posts', since='вчера')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImportDataCommandTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.source = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.source, ignore_errors=True)
+
+    def write(self, name, content):
+        path = os.path.join(self.source, name)
+        with open(path, 'w', encoding='utf-8', newline='') as output:
+            output.write(content)
+        return path
+
+    def test_import(self):
+        """Посты, комментарии и подписки загружаются пачками,
+        недостающие авторы и группы создаются"""
+        with open(os.path.join(self.source, 'pic.gif'), 'wb') as image:
+            image.write(b'GIF89a')
+        rows = (
+            {'id': 10, 'author': 'auth', 'group': 'test-slug',
+             'text': 'Перенесённый пост', 'pub_date': '2020-01-02T03:04:05',
+             'image': 'pic.gif'},
+            {'id': 11, 'author': 'newbie', 'group': 'new-group',
+             'text': 'Пост нового автора'},
+            {'id': 12, 'author': 'auth', 'text': 'Пост без группы'},
+        )
+        posts = self.write(
+            'posts.ndjson', '\n'.join(json.dumps(row) for row in rows))
+        comments = self.write(
+            'comments.csv',
+            'post,author,text,pub_date\r\n'
+            '10,newbie,Перенесённый комментарий,\r\n'
+            '12,newbie,Ещё комментарий,2020-01-03T00:00:00\r\n')
+        follows = self.write(
+            'follows.ndjson',
+            '{"user": "newbie", "author": "auth"}\n'
+            '{"user": "auth", "author": "auth"}\n')
+        out = StringIO()
+        call_command(
+            'import_data', posts=posts, comments=comments, follows=follows,
+            media_root=self.source, batch_size=2, stdout=out)
+        self.assertIn('posts: 3', out.getvalue())
+        post = Post.objects.get(text='Перенесённый пост')
+        self.assertEqual(post.group, self.group)
+        self.assertEqual(post.pub_date.year, 2020)
+        self.assertTrue(post.image.name.startswith('posts/pic'))
+        self.assertEqual(post.comments_count, 1)
+        newbie = User.objects.get(username='newbie')
+        self.assertFalse(newbie.has_usable_password())
+        self.assertEqual(
+            Group.objects.get(slug='new-group').posts_count, 1)
+        self.assertEqual(AuthorStats.objects.get(
+            user=self.author).posts_count, 2)
+        self.assertEqual(list(Follow.objects.values_list(
+            'user__username', 'author__username')), [('newbie', 'auth')])
+        if connection.vendor == 'sqlite':
+            hits, _ = search('Перенесённый')
+            self.assertEqual(
+                sorted((kind, post_id) for kind, post_id, _ in hits),
+                [('comment', post.pk), ('post', post.pk)])
+
+    def test_deleted_post_ids_not_reused(self):
+        """Импорт не занимает id удалённых постов, а новые посты сайта
+        получают id после импортированных"""
+        deleted = Post.objects.create(author=self.author, text='Удалённый')
+        deleted_pk = deleted.pk
+        deleted.delete()
+        posts = self.write(
+            'posts.ndjson', '{"author": "auth", "text": "Импорт"}\n')
+        call_command('import_data', posts=posts, stdout=StringIO())
+        imported = Post.objects.get(text='Импорт')
+        self.assertGreater(imported.pk, deleted_pk)
+        self.assertGreater(
+            Post.objects.create(author=self.author, text='Новый').pk,
+            imported.pk)
+
+    def test_unknown_post(self):
+        """Комментарий к неизвестному посту - ошибка команды"""
+        comments = self.write(
+            'comments.ndjson',
+            '{"post": 1, "author": "auth", "text": "Комментарий"}\n')
+        with self.assertRaises(CommandError):
+            call_command('import_data', comments=comments, stdout=StringIO())
+
+
+class GenerateSitemapsCommandTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Тестовый пост {i}')
+            for i in range(5)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        self.settings_override = override_settings(
+            SITEMAP_ROOT=root, SITEMAP_CHUNK_SIZE=2)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.root = root
+
+    def generate(self, **options):
+        out = StringIO()
+        call_command('generate_sitemaps', domain='testserver',
+                     stdout=out, **options)
+        return out.getvalue().splitlines()[:-1]
+
+    def read(self, name):
+        with open(os.path.join(self.root, name), encoding='utf-8') as file:
+            return file.read()
+
+    def test_chunks_and_index(self):
+        """Посты, группы и авторы раскладываются по кускам с индексом"""
+        chunks = sorted({post.pk // 2 for post in self.posts})
+        expected = (
+            [f'posts-{chunk}.xml' for chunk in chunks]
+            + [f'groups-{self.group.pk // 2}.xml',
+               f'authors-{self.author.pk // 2}.xml']
+        )
+        self.assertEqual(self.generate(), expected)
+        index = self.read(INDEX_FILE)
+        for name in expected:
+            self.assertIn(f'https://testserver/sitemaps/{name}', index)
+        post = self.posts[0]
+        self.assertIn(
+            f'https://testserver/posts/{post.pk}/',
+            self.read(f'posts-{post.pk // 2}.xml'))
+        self.assertIn(
+            'https://testserver/profile/auth/',
+            self.read(f'authors-{self.author.pk // 2}.xml'))
+
+    def test_only_touched_chunks_rebuilt(self):
+        """Повторная сборка трогает только куски с изменёнными записями"""
+        self.generate()
+        self.assertEqual(self.generate(), [])
+        post = self.posts[0]
+        post.text = 'Изменённый пост'
+        post.save()
+        self.assertEqual(self.generate(), [])
+        self.group.slug = 'new-slug'
+        self.group.save()
+        self.assertEqual(
+            self.generate(), [f'groups-{self.group.pk // 2}.xml'])
+        new_post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertEqual(self.generate(), [
+            f'posts-{new_post.pk // 2}.xml',
+            f'authors-{self.author.pk // 2}.xml',
+        ])
+        self.assertIn(
+            f'/posts/{new_post.pk}/',
+            self.read(f'posts-{new_post.pk // 2}.xml'))
+
+    @override_settings(SITEMAP_CHUNK_SIZE=1000)
+    def test_changes_outside_signals_rebuilt(self):
+        """Пост в уже записанном куске, созданный без сигналов и в обход
+        кэша, попадает в карту"""
+        self.generate()
+        pk = self.posts[-1].pk + 1
+        Post.objects.bulk_create(
+            [Post(pk=pk, author=self.author, text='Без сигналов')])
+        cache.clear()
+        name = f'posts-{pk // 1000}.xml'
+        self.assertIn(name, self.generate())
+        self.assertIn(f'/posts/{pk}/', self.read(name))
+
+    def test_emptied_chunk_removed(self):
+        """Кусок без объектов удаляется с диска и из индекса"""
+        self.generate()
+        post = self.posts[-1]
+        name = f'posts-{post.pk // 2}.xml'
+        Post.objects.filter(pk__gte=post.pk // 2 * 2).delete()
+        self.assertIn(name, self.generate())
+        self.assertFalse(os.path.exists(os.path.join(self.root, name)))
+        self.assertNotIn(name, self.read(INDEX_FILE))
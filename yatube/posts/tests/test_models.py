@@ -1,6 +1,11 @@
+from io import StringIO
+
+from django.core.management import call_command
 from django.test import TestCase
 from django.conf import settings
-from ..models import Group, Post, User
+
+from ..counters import recount_counters
+from ..models import AuthorStats, Comment, Follow, Group, Post, User
 
 
 class PostModelTest(TestCase):
@@ -53,3 +58,108 @@ class PostModelTest(TestCase):
             with self.subTest(field=field):
                 self.assertEqual(
                     self.post._meta.get_field(field).help_text, expected_value)
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='slug_slug',
+            description='Тестовое описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other_slug',
+            description='Тестовое описание',
+        )
+
+    def assertCounters(self, group_posts, other_posts, author_posts):
+        self.group.refresh_from_db()
+        self.other_group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, group_posts)
+        self.assertEqual(self.other_group.posts_count, other_posts)
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.user).posts_count, author_posts)
+
+    def test_post_counters_follow_writes(self):
+        """Счётчики постов следуют за созданием, правкой и удалением"""
+        post = Post.objects.create(
+            author=self.user, group=self.group, text='Пост')
+        self.assertCounters(1, 0, 1)
+        post.group = self.other_group
+        post.save()
+        self.assertCounters(0, 1, 1)
+        post.delete()
+        self.assertCounters(0, 0, 0)
+
+    def test_comment_and_follow_counters_follow_writes(self):
+        """Счётчики комментариев и подписок следуют за записями"""
+        post = Post.objects.create(author=self.user, text='Пост')
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий')
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        follow = Follow.objects.create(user=self.reader, author=self.user)
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.user).followers_count, 1)
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.reader).following_count, 1)
+        follow.delete()
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.user).followers_count, 0)
+
+    def test_reassigned_post_and_comment_move_counters(self):
+        """Смена автора поста и поста комментария переносит счётчики"""
+        post = Post.objects.create(author=self.user, text='Пост')
+        other_post = Post.objects.create(author=self.user, text='Другой')
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий')
+        post.author = self.reader
+        post.save()
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.user).posts_count, 1)
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.reader).posts_count, 1)
+        comment.post = other_post
+        comment.save()
+        post.refresh_from_db()
+        other_post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertEqual(other_post.comments_count, 1)
+
+    def test_recount_command_repairs_counters(self):
+        """recount_counters восстанавливает счётчики после bulk-записей"""
+        Post.objects.bulk_create(
+            Post(author=self.user, group=self.group, text=f'Пост {i}')
+            for i in range(3)
+        )
+        Follow.objects.bulk_create(
+            [Follow(user=self.reader, author=self.user)])
+        AuthorStats.objects.all().delete()
+        call_command('recount_counters', stdout=StringIO())
+        self.assertCounters(3, 0, 3)
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.user).followers_count, 1)
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.reader).following_count, 1)
+
+    def test_recount_limited_to_given_rows(self):
+        """recount_counters с pk пересчитывает только эти строки"""
+        Post.objects.bulk_create(
+            Post(author=self.user, group=self.group, text=f'Пост {i}')
+            for i in range(3)
+        )
+        AuthorStats.objects.all().delete()
+        recount_counters(users={self.user.pk}, groups=set(), posts=set())
+        self.assertCounters(0, 0, 3)
+        self.assertFalse(
+            AuthorStats.objects.filter(user=self.reader).exists())
+        recount_counters(users=set(), groups={self.group.pk}, posts=set())
+        self.assertCounters(3, 0, 3)
@@ -1,12 +1,28 @@
+import os
+import time
+from unittest import mock
+
 from django import forms
 from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
 from django.urls import reverse
 from django.conf import settings
 
+from core.db import PRIMARY_COOKIE
+from core.templatetags.single_flight import fragment_cache
+
+from ..cache import (FEED_MODIFIED_KEY, INDEX_FEED, feed_cache, post_feeds,
+                     profile_feed, syndicated_feed)
+from ..conditional import conditional_counts, conditional_stats
 from ..forms import PostForm
-from ..models import Group, Post, User, Follow
+from ..thumbnails import generate_thumbnails
+from ..timelines import feed_path_counts, feed_path_stats
+from ..models import Comment, Group, Post, User, Follow
 
 
 class PostViewsTests(TestCase):
@@ -177,7 +193,7 @@ class PostViewsTests(TestCase):
         base_data = self.authorized_client.get(
             reverse(name)
         ).content
-        Post.objects.filter(id=self.post.id).delete()
+        Post.objects.filter(id=self.post.id).update(text='Без сигналов')
         renew_data = self.authorized_client.get(
             reverse(name)
         ).content
@@ -188,6 +204,67 @@ class PostViewsTests(TestCase):
         ).content
         self.assertNotEqual(renew_data, wiped_data)
 
+    def test_cache_invalidated_by_post_changes(self):
+        """Создание, правка и удаление поста сбрасывают кэш лент"""
+        feeds = (self.index_url, self.group_url, self.profile_url)
+        for name, args, _ in feeds:
+            self.authorized_client.get(reverse(name, args=args))
+        new_post = Post.objects.create(
+            author=self.user, group=self.group, text='Свежий пост'
+        )
+        for name, args, _ in feeds:
+            with self.subTest(name=name):
+                response = self.authorized_client.get(
+                    reverse(name, args=args)
+                )
+                self.assertContains(response, 'Свежий пост')
+        new_post.group = None
+        new_post.save()
+        name, args, _ = self.group_url
+        response = self.authorized_client.get(reverse(name, args=args))
+        self.assertNotContains(response, 'Свежий пост')
+        new_post.delete()
+        name, args, _ = self.index_url
+        response = self.authorized_client.get(reverse(name, args=args))
+        self.assertNotContains(response, 'Свежий пост')
+
+    def test_thumbnail_rendered_only_when_ready(self):
+        """Миниатюра не режется при рендере, до готовности - заглушка"""
+        name, args, _ = self.post_detail_url
+        cache.clear()
+        response = self.guest_client.get(reverse(name, args=args))
+        self.assertContains(response, 'Картинка обрабатывается')
+        generate_thumbnails(self.post.image.name)
+        response = self.guest_client.get(reverse(name, args=args))
+        self.assertNotContains(response, 'Картинка обрабатывается')
+        self.assertContains(response, '<img class="card-img my-2"')
+
+    def test_ready_thumbnail_invalidates_feeds(self):
+        """Готовая миниатюра заменяет заглушку в кэшированных лентах"""
+        cache.clear()
+        feeds = (self.index_url, self.group_url, self.profile_url)
+        for name, args, _ in feeds:
+            response = self.guest_client.get(reverse(name, args=args))
+            self.assertContains(response, 'Картинка обрабатывается')
+        generate_thumbnails(self.post.image.name, post_feeds(self.post))
+        for name, args, _ in feeds:
+            with self.subTest(name=name):
+                response = self.guest_client.get(reverse(name, args=args))
+                self.assertNotContains(response, 'Картинка обрабатывается')
+
+    def test_server_timing_header(self):
+        """Ответ содержит метрики запроса в Server-Timing"""
+        cache.clear()
+        name, args, _ = self.post_detail_url
+        with CaptureQueriesContext(connection) as context:
+            response = self.authorized_client.get(reverse(name, args=args))
+        timing = response['Server-Timing']
+        self.assertIn(f'desc="{len(context)} queries"', timing)
+        for metric in ('db;dur=', 'tpl;dur=', 'cache;desc="hits=',
+                       'total;dur='):
+            with self.subTest(metric=metric):
+                self.assertIn(metric, timing)
+
     def test_authorized_user_follow(self):
         """Авторизованный пользователь может подписываться
         на других пользователей"""
@@ -289,3 +366,754 @@ class PaginatorViewsTest(TestCase):
                             len(response.context['page_obj'].object_list),
                             numbers
                         )
+
+
+class CursorPaginatorViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='auth')
+        cls.ALL_POSTS = 13
+        Post.objects.bulk_create(
+            [Post(author=cls.author, text=f'Тестовый пост {i}')
+             for i in range(cls.ALL_POSTS)]
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def test_cursor_pages_walk_whole_feed(self):
+        """Курсоры ведут вперёд и назад без пропусков и повторов"""
+        url = reverse('posts:index')
+        first = self.guest_client.get(url + '?cursor=').context['page_obj']
+        self.assertEqual(len(first), settings.POSTS_PER_PAGE)
+        self.assertFalse(first.has_previous())
+        second = self.guest_client.get(
+            url + f'?cursor={first.next_cursor}'
+        ).context['page_obj']
+        self.assertEqual(
+            len(second), self.ALL_POSTS - settings.POSTS_PER_PAGE
+        )
+        self.assertFalse(second.has_next())
+        expected = list(Post.objects.order_by('-pub_date', '-pk'))
+        self.assertEqual(list(first) + list(second), expected)
+        back = self.guest_client.get(
+            url + f'?cursor={second.previous_cursor}'
+        ).context['page_obj']
+        self.assertEqual(list(back), list(first))
+
+    def test_broken_cursor_returns_first_page(self):
+        """Битый курсор отдаёт первую страницу"""
+        response = self.guest_client.get(
+            reverse('posts:index') + '?cursor=broken!'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            list(response.context['page_obj']),
+            list(Post.objects.order_by('-pub_date', '-pk'))[
+                :settings.POSTS_PER_PAGE]
+        )
+
+
+class FeedPaginatorViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.ALL_POSTS = 35
+        for i in range(cls.ALL_POSTS):
+            Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Тестовый пост {i}')
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.guest_client.get(url)
+        return response, [
+            query['sql'] for query in context.captured_queries
+            if 'COUNT(' in query['sql']
+        ]
+
+    def test_feed_count_is_cached_until_new_post(self):
+        """Число постов ленты берётся из кэша до появления нового поста"""
+        url = reverse('posts:index')
+        response, counts = self.count_queries(url)
+        self.assertEqual(len(counts), 1)
+        self.assertEqual(
+            response.context['page_obj'].paginator.count, self.ALL_POSTS)
+        _, counts = self.count_queries(url)
+        self.assertEqual(counts, [])
+        Post.objects.create(author=self.author, text='Новый пост')
+        response, counts = self.count_queries(url)
+        self.assertEqual(len(counts), 1)
+        self.assertEqual(
+            response.context['page_obj'].paginator.count, self.ALL_POSTS + 1)
+
+    @override_settings(PAGINATOR_EXACT_COUNT_LIMIT=20)
+    def test_long_feed_count_is_estimated(self):
+        """Длинная лента считается по счётчику группы"""
+        Group.objects.filter(pk=self.group.pk).update(posts_count=100)
+        response = self.guest_client.get(
+            reverse('posts:group_list', args=(self.group.slug,)))
+        self.assertEqual(response.context['page_obj'].paginator.count, 100)
+
+    @override_settings(PAGINATOR_WINDOW=1)
+    def test_page_window(self):
+        """Пагинатор показывает только соседние страницы"""
+        url = reverse('posts:profile', args=(self.author.username,))
+        for page, window in ((1, [1, 2]), (2, [1, 2, 3]), (4, [3, 4])):
+            with self.subTest(page=page):
+                response = self.guest_client.get(url, {'page': page})
+                page_obj = response.context['page_obj']
+                self.assertEqual(list(page_obj.page_window), window)
+        self.assertNotContains(response, 'href="?page=2"')
+
+
+class QueryCountViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='slug_slug',
+            description='Тестовое описание',
+        )
+        cls.post = cls.add_posts(1)[0]
+
+    @classmethod
+    def add_posts(cls, count):
+        posts = []
+        start = Post.objects.count()
+        for i in range(start, start + count):
+            author = User.objects.create(username=f'author_{i}')
+            posts.append(Post.objects.create(
+                author=author, group=cls.group, text=f'Пост {i}'
+            ))
+            Follow.objects.create(user=cls.user, author=author)
+        return posts
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            self.authorized_client.get(url)
+        return len(context)
+
+    def test_query_count_does_not_grow_with_data(self):
+        """Число запросов не зависит от числа постов и комментариев"""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.post.author,)),
+            reverse('posts:post_detail', args=(self.post.pk,)),
+            reverse('posts:follow_index'),
+        )
+        before = [self.count_queries(url) for url in urls]
+        self.add_posts(settings.POSTS_PER_PAGE)
+        Comment.objects.bulk_create(
+            Comment(
+                post=self.post,
+                author=User.objects.create(username=f'commenter_{i}'),
+                text=f'Комментарий {i}',
+            )
+            for i in range(5)
+        )
+        for url, expected in zip(urls, before):
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url), expected)
+
+
+@override_settings(FOLLOW_TIMELINES=True)
+class FollowTimelineViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='reader')
+        cls.author = User.objects.create(username='auth')
+        cls.old_post = Post.objects.create(author=cls.author, text='Старый')
+
+    def setUp(self):
+        cache.clear()
+        feed_path_counts.reset()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def feed(self):
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        return list(response.context['page_obj'])
+
+    def test_timeline_follows_posts_and_subscriptions(self):
+        """Лента подписок обновляется при записи, без join при чтении"""
+        self.assertEqual(self.feed(), [])
+        self.authorized_client.get(
+            reverse('posts:profile_follow', args=(self.author,)))
+        self.assertEqual(self.feed(), [self.old_post])
+        new_post = Post.objects.create(author=self.author, text='Новый')
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.feed(), [new_post, self.old_post])
+        self.assertFalse(
+            any('posts_follow' in query['sql']
+                and '"posts_post"' in query['sql']
+                for query in context.captured_queries)
+        )
+        new_post.delete()
+        self.assertEqual(self.feed(), [self.old_post])
+        self.authorized_client.get(
+            reverse('posts:profile_unfollow', args=(self.author,)))
+        self.assertEqual(self.feed(), [])
+
+    def test_updates_do_not_extend_timeline(self):
+        """Правки не продлевают готовую ленту: по истечении срока с
+        момента сборки она собирается из БД заново"""
+        Follow.objects.create(user=self.user, author=self.author)
+        built = time.time()
+        self.assertEqual(self.feed(), [self.old_post])
+        # Пост мимо сигналов - как правка, потерянная в гонке
+        Post.objects.bulk_create([Post(author=self.author, text='Потерян')])
+        lost = Post.objects.get(text='Потерян')
+        timeout = settings.TIMELINE_CACHE_TIMEOUT
+        with mock.patch('time.time', return_value=built + timeout / 2):
+            new_post = Post.objects.create(author=self.author, text='Новый')
+        self.assertEqual(self.feed(), [new_post, self.old_post])
+        with mock.patch('time.time', return_value=built + timeout + 1):
+            self.assertEqual(self.feed(), [new_post, lost, self.old_post])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_celebrity_posts_merged_at_read_time(self):
+        """Посты популярных авторов подмешиваются в ленту при чтении"""
+        regular = User.objects.create(username='regular')
+        Follow.objects.create(user=self.user, author=regular)
+        Follow.objects.create(user=self.user, author=self.author)
+        regular_post = Post.objects.create(author=regular, text='Обычный')
+        celebrity_post = Post.objects.create(
+            author=self.author, text='Знаменитый')
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(response['X-Feed-Path'], 'hybrid')
+        self.assertEqual(
+            list(response.context['page_obj']),
+            [celebrity_post, regular_post, self.old_post]
+        )
+        self.assertEqual(feed_path_stats()['hybrid'], 1)
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=2)
+    def test_author_below_limit_returns_to_timelines(self):
+        """Посты автора, опустившегося ниже порога, остаются в ленте"""
+        other = User.objects.create(username='other')
+        Follow.objects.create(user=self.user, author=self.author)
+        follow = Follow.objects.create(user=other, author=self.author)
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(response['X-Feed-Path'], 'hybrid')
+        follow.delete()
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(response['X-Feed-Path'], 'timeline')
+        self.assertEqual(list(response.context['page_obj']), [self.old_post])
+
+
+class ConditionalGetViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='auth')
+        cls.reader = User.objects.create(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Тестовый пост')
+
+    def setUp(self):
+        cache.clear()
+        conditional_counts.reset()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def revalidate(self, client, url):
+        etag = client.get(url)['ETag']
+        return client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_pages_not_modified(self):
+        """Неизменившиеся страницы отвечают 304 без рендера"""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.author.username,)),
+            reverse('posts:post_detail', args=(self.post.pk,)),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.revalidate(self.guest_client, url)
+                self.assertEqual(response.status_code, 304)
+                self.assertIsNone(response.context)
+        stats = conditional_stats()
+        self.assertEqual(
+            stats['index'],
+            {'requests': 2, 'not_modified': 1, 'hit_rate': 0.5},
+        )
+
+    def test_last_modified(self):
+        """Страница не изменялась с If-Modified-Since - 304"""
+        url = reverse('posts:index')
+        last_modified = self.guest_client.get(url)['Last-Modified']
+        response = self.guest_client.get(
+            url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def rename_group(self):
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Новое название'
+        group.save()
+
+    def test_stats_for_staff(self):
+        """Доли 304 видны сотрудникам"""
+        url = reverse('posts:index')
+        self.revalidate(self.guest_client, url)
+        self.assertEqual(
+            self.authorized_client.get(reverse('posts:stats')).status_code,
+            302)
+        admin = User.objects.create(username='admin', is_staff=True)
+        self.authorized_client.force_login(admin)
+        stats = self.authorized_client.get(reverse('posts:stats')).json()
+        self.assertEqual(stats['conditional']['index']['not_modified'], 1)
+        self.assertIn('hybrid', stats['feed_paths'])
+        self.assertEqual(stats['cache']['pid'], os.getpid())
+        self.assertIn('posts:feeds', stats['cache']['namespaces'])
+
+    def test_changes_invalidate_validators(self):
+        """Новые посты, правки, комментарии и подписки меняют ETag"""
+        detail = reverse('posts:post_detail', args=(self.post.pk,))
+        profile = reverse('posts:profile', args=(self.author.username,))
+        changes = (
+            (reverse('posts:index'), lambda: Post.objects.create(
+                author=self.reader, text='Новый пост')),
+            (detail, lambda: Post.objects.get(pk=self.post.pk).save()),
+            (detail, lambda: Comment.objects.create(
+                post=self.post, author=self.reader, text='Комментарий')),
+            (detail, self.rename_group),
+            (profile, lambda: Follow.objects.create(
+                user=self.reader, author=self.author)),
+        )
+        for url, change in changes:
+            with self.subTest(url=url):
+                etag = self.authorized_client.get(url)['ETag']
+                change()
+                response = self.authorized_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_stale_fragment_served_without_validators(self):
+        """Устаревший фрагмент отдаётся без ETag, чтобы не закрепиться"""
+        url = reverse('posts:index')
+        self.guest_client.get(url)
+        Post.objects.create(author=self.author, text='Свежий пост')
+        lock_key = make_template_fragment_key('posts', [url, 1]) + ':lock'
+        fragment_cache.add(lock_key, True)
+        response = self.guest_client.get(url)
+        self.assertNotContains(response, 'Свежий пост')
+        self.assertFalse(response.has_header('ETag'))
+        self.assertIn('no-cache', response['Cache-Control'])
+        fragment_cache.delete(lock_key)
+        response = self.guest_client.get(url)
+        self.assertContains(response, 'Свежий пост')
+        self.assertTrue(response.has_header('ETag'))
+
+    def test_etag_depends_on_user(self):
+        """Гость и пользователь получают разные ETag"""
+        url = reverse('posts:index')
+        self.assertNotEqual(
+            self.guest_client.get(url)['ETag'],
+            self.authorized_client.get(url)['ETag'],
+        )
+
+
+class PostCardCacheViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(
+            username='auth', first_name='Лев', last_name='Толстой')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Тестовый пост')
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def test_cards_shared_between_feeds(self):
+        """Карточка, отрисованная в одной ленте, берётся из кэша в другой"""
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertTemplateUsed(response, 'includes/post_card.html')
+        response = self.guest_client.get(
+            reverse('posts:group_list', args=(self.group.slug,)))
+        self.assertTemplateNotUsed(response, 'includes/post_card.html')
+        self.assertContains(response, self.post.text)
+
+    def test_edit_and_rename_refresh_cards(self):
+        """Правка поста и смена имени автора видны в лентах сразу"""
+        url = reverse('posts:profile', args=(self.author.username,))
+        self.guest_client.get(url)
+        self.author_client.post(
+            reverse('posts:post_edit', args=(self.post.pk,)),
+            data={'text': 'Исправленный пост', 'group': self.group.pk},
+        )
+        response = self.guest_client.get(url)
+        self.assertContains(response, 'Исправленный пост')
+        self.author.first_name = 'Николай'
+        self.author.save()
+        response = self.guest_client.get(url)
+        self.assertContains(response, 'Николай Толстой')
+        self.assertNotContains(response, 'Лев Толстой')
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingViewsTest(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='reader')
+        self.post = Post.objects.create(author=self.user, text='Тестовый пост')
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.age_feeds()
+
+    def age_feeds(self):
+        """ Изменения лент старше DATABASE_REPLICA_LAG: реплика догнала. """
+        for feed in (INDEX_FEED, profile_feed(self.user.pk)):
+            for name in (feed, syndicated_feed(feed)):
+                feed_cache.set(FEED_MODIFIED_KEY.format(name), 0, None)
+
+    def replica_queries(self, client, url):
+        with CaptureQueriesContext(connections['replica']) as context:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context)
+
+    def test_feed_pages_read_from_replica(self):
+        """Страницы лент и постов читают с реплики"""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:profile', args=(self.user.username,)),
+            reverse('posts:post_detail', args=(self.post.pk,)),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertGreater(
+                    self.replica_queries(self.guest_client, url), 0)
+
+    def test_read_your_writes(self):
+        """После своей записи пользователь читает с основной БД"""
+        url = reverse('posts:post_detail', args=(self.post.pk,))
+        self.assertGreater(
+            self.replica_queries(self.authorized_client, url), 0)
+        response = self.authorized_client.post(
+            reverse('posts:add_comment', args=(self.post.pk,)),
+            data={'text': 'Комментарий'},
+        )
+        self.assertIn(PRIMARY_COOKIE, response.cookies)
+        self.assertEqual(
+            self.replica_queries(self.authorized_client, url), 0)
+        self.assertContains(self.authorized_client.get(url), 'Комментарий')
+        self.age_feeds()
+        self.assertGreater(
+            self.replica_queries(self.guest_client, url), 0)
+
+    def test_fresh_feed_read_from_primary(self):
+        """Пока реплика может отставать от новой версии ленты, лента
+        читается с основной БД и не кэширует устаревший рендер"""
+        url = reverse('posts:index')
+        Post.objects.create(author=self.user, text='Свежий пост')
+        self.assertEqual(self.replica_queries(self.guest_client, url), 0)
+        self.assertEqual(self.replica_queries(
+            self.guest_client,
+            reverse('posts:syndication_index', args=('rss',))), 0)
+        self.age_feeds()
+        self.assertGreater(self.replica_queries(
+            self.guest_client,
+            reverse('posts:profile', args=(self.user.username,))), 0)
+
+    @override_settings(FOLLOW_TIMELINES=True)
+    def test_timeline_built_from_primary(self):
+        """Лента подписок, которая ляжет в кэш, собирается с основной БД"""
+        author = User.objects.create(username='auth')
+        Follow.objects.create(user=self.user, author=author)
+        with CaptureQueriesContext(connections['replica']) as context:
+            self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertFalse(any(
+            'posts_follow' in query['sql'] and '"posts_post"' in query['sql']
+            for query in context.captured_queries))
+
+
+class ExportViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='user')
+        cls.admin = User.objects.create(username='admin', is_staff=True)
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    def setUp(self):
+        self.user_client = Client()
+        self.user_client.force_login(self.user)
+        self.admin_client = Client()
+        self.admin_client.force_login(self.admin)
+
+    def test_export_only_for_staff(self):
+        """Выгрузка доступна только сотрудникам"""
+        response = self.user_client.get(
+            reverse('posts:export', args=('posts',)))
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(reverse('admin:login'), response.url)
+
+    def test_export_streams(self):
+        """Выгрузка отдаётся потоком"""
+        response = self.admin_client.get(
+            reverse('posts:export', args=('posts',)), {'format': 'csv'})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        content = b''.join(response.streaming_content).decode()
+        self.assertIn('Тестовый пост', content)
+
+    def test_export_errors(self):
+        """Неизвестная выгрузка - 404, неверная дата - 400"""
+        url = reverse('posts:export', args=('posts',))
+        self.assertEqual(
+            self.admin_client.get(
+                reverse('posts:export', args=('users',))).status_code, 404)
+        self.assertEqual(
+            self.admin_client.get(url, {'format': 'xml'}).status_code, 404)
+        self.assertEqual(
+            self.admin_client.get(url, {'since': 'вчера'}).status_code, 400)
+
+
+class SyndicationViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Тестовый пост')
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_feeds(self):
+        """Ленты RSS и Atom для главной, группы и автора"""
+        feeds = (
+            ('posts:syndication_index', ()),
+            ('posts:syndication_group', (self.group.slug,)),
+            ('posts:syndication_author', (self.author.username,)),
+        )
+        for name, args in feeds:
+            for feed_format, content_type in (
+                    ('rss', 'application/rss+xml'),
+                    ('atom', 'application/atom+xml')):
+                with self.subTest(name=name, feed_format=feed_format):
+                    response = self.guest_client.get(
+                        reverse(name, args=(*args, feed_format)))
+                    self.assertTrue(
+                        response['Content-Type'].startswith(content_type))
+                    self.assertContains(response, 'Тестовый пост')
+                    self.assertContains(response, reverse(
+                        'posts:post_detail', args=(self.post.pk,)))
+
+    def test_served_from_cache(self):
+        """Повторный опрос - из кэша без запросов к БД, с 304 по ETag"""
+        url = reverse('posts:syndication_group', args=(self.group.slug, 'rss'))
+        response = self.guest_client.get(url)
+        with self.assertNumQueries(0):
+            cached = self.guest_client.get(url)
+            not_modified = self.guest_client.get(
+                url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.content, response.content)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(
+            self.guest_client.get(
+                url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+            ).status_code, 304)
+
+    def test_new_post_rerenders(self):
+        """Новый пост меняет ETag и попадает в ленту"""
+        url = reverse('posts:syndication_index', args=('atom',))
+        etag = self.guest_client.get(url)['ETag']
+        Post.objects.create(author=self.author, text='Свежий пост')
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Свежий пост')
+
+    def test_comment_keeps_feed(self):
+        """Комментарий не меняет RSS и Atom: опрос по-прежнему 304"""
+        url = reverse('posts:syndication_index', args=('rss',))
+        response = self.guest_client.get(url)
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Комментарий')
+        self.assertEqual(self.guest_client.get(
+            url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.guest_client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        ).status_code, 304)
+
+    def test_renamed_owner_address_reused(self):
+        """Лента по адресу переименованной группы или автора следует за
+        новым владельцем адреса"""
+        for name, model, field, owner in (
+                ('posts:syndication_group', Group, 'slug', self.group),
+                ('posts:syndication_author', User, 'username', self.author)):
+            with self.subTest(name=name):
+                old = model.objects.get(pk=owner.pk)
+                key = getattr(old, field)
+                url = reverse(name, args=(key, 'rss'))
+                self.assertContains(self.guest_client.get(url), 'Тестовый')
+                setattr(old, field, f'renamed-{key}')
+                old.save()
+                new = model.objects.create(**{field: key})
+                etag = self.guest_client.get(url)['ETag']
+                Post.objects.create(
+                    author=new if model is User else self.author,
+                    group=new if model is Group else None,
+                    text='Пост нового владельца')
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertContains(response, 'Пост нового владельца')
+
+    def test_missing_owner(self):
+        """Лента несуществующей группы или автора - 404"""
+        for name in ('posts:syndication_group', 'posts:syndication_author'):
+            with self.subTest(name=name):
+                response = self.guest_client.get(
+                    reverse(name, args=('missing', 'rss')))
+                self.assertEqual(response.status_code, 404)
+
+
+class SearchViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='auth')
+        cls.reader = User.objects.create(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='slug_slug',
+            description='Тестовое описание',
+        )
+        cls.group_post = Post.objects.create(
+            author=cls.author, group=cls.group,
+            text='Кошки спят кошки едят кошки')
+        cls.other_post = Post.objects.create(
+            author=cls.author, text='Про кошку и собак')
+        cls.comment = Comment.objects.create(
+            post=cls.other_post, author=cls.reader, text='Люблю кошки')
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def search(self, **params):
+        response = self.guest_client.get(
+            reverse('posts:search_api'), params)
+        return response.json()
+
+    def test_search_ranks_posts_and_comments(self):
+        """Поиск находит посты и комментарии, лучшие совпадения выше"""
+        results = self.search(q='кошки')['results']
+        self.assertEqual(
+            [(hit['kind'], hit['post_id']) for hit in results],
+            [('post', self.group_post.pk), ('comment', self.other_post.pk)]
+        )
+
+    def test_search_filters_and_cursor(self):
+        """Фильтры по группе и автору, курсор ведёт дальше"""
+        results = self.search(q='кошки', group=self.group.slug)['results']
+        self.assertEqual([hit['post_id'] for hit in results],
+                         [self.group_post.pk])
+        results = self.search(q='кошки', author='reader')['results']
+        self.assertEqual([hit['kind'] for hit in results], ['comment'])
+        with self.settings(POSTS_PER_PAGE=1):
+            first = self.search(q='кошки')
+            second = self.search(q='кошки', cursor=first['next_cursor'])
+        self.assertEqual(second['results'][0]['kind'], 'comment')
+        self.assertIsNone(second['next_cursor'])
+
+    def test_search_index_follows_writes(self):
+        """Правка и удаление поста обновляют индекс"""
+        self.other_post.text = 'Теперь про собак'
+        self.other_post.save()
+        self.comment.delete()
+        results = self.search(q='кошки')['results']
+        self.assertEqual([hit['post_id'] for hit in results],
+                         [self.group_post.pk])
+        response = self.guest_client.get(
+            reverse('posts:search'), {'q': 'собак'})
+        self.assertContains(response, 'Теперь про собак')
+
+
+@override_settings(COMMENTS_PER_PAGE=3)
+class CommentPagesViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='auth')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+        cls.comments = [
+            Comment.objects.create(
+                post=cls.post, author=cls.author, text=f'Комментарий {i}')
+            for i in range(5)
+        ]
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def test_post_detail_embeds_first_page_only(self):
+        """На странице поста только первая порция комментариев"""
+        response = self.guest_client.get(
+            reverse('posts:post_detail', args=(self.post.pk,)))
+        comments = response.context['comments']
+        self.assertEqual(list(comments), self.comments[:1:-1])
+        self.assertContains(response, 'Показать ещё')
+
+    def test_next_comments_loaded_by_cursor(self):
+        """Остальные комментарии догружаются по курсору"""
+        response = self.guest_client.get(
+            reverse('posts:post_detail', args=(self.post.pk,)))
+        url = reverse('posts:post_comments', args=(self.post.pk,))
+        cursor = response.context['comments'].next_cursor
+        fragment = self.guest_client.get(url, {'cursor': cursor})
+        self.assertEqual(
+            list(fragment.context['comments']), self.comments[1::-1])
+        self.assertNotContains(fragment, 'Показать ещё')
+        data = self.guest_client.get(
+            url, {'cursor': cursor, 'format': 'json'}).json()
+        self.assertEqual(
+            [comment['id'] for comment in data['comments']],
+            [comment.pk for comment in self.comments[1::-1]]
+        )
+        self.assertIsNone(data['next_cursor'])
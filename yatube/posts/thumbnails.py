@@ -0,0 +1,63 @@
+import logging
+
+from django.conf import settings
+from sorl.thumbnail import get_thumbnail
+
+from core.cache import NamespacedCache
+from core.tasks import run_in_background
+
+from .cache import bump_feed_versions, post_feeds
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_KEY = 'url:{}:{}'
+PENDING_KEY = 'pending:{}'
+PENDING_TIMEOUT = 60
+
+thumbnail_cache = NamespacedCache('posts:thumbnails')
+
+
+def thumbnail_key(name, geometry):
+    return THUMBNAIL_KEY.format(name, geometry)
+
+
+def generate_thumbnails(name, feeds=()):
+    """ Готовит миниатюры всех размеров из POST_THUMBNAILS.
+
+    Ленты поста с этой картинкой (feeds) сбрасываются: в их кэше заглушка.
+    """
+    for geometry, options in settings.POST_THUMBNAILS.items():
+        try:
+            thumbnail = get_thumbnail(name, geometry, **options)
+        except Exception:
+            logger.exception('Не удалось подготовить миниатюру %s', name)
+            continue
+        thumbnail_cache.set(
+            thumbnail_key(name, geometry), thumbnail.url, None)
+    thumbnail_cache.delete(PENDING_KEY.format(name))
+    bump_feed_versions(*feeds, syndication=False)
+
+
+def schedule_thumbnails(post):
+    """ Ставит картинку поста в очередь фоновой нарезки (один раз). """
+    image = post.image
+    if image and thumbnail_cache.add(
+            PENDING_KEY.format(image.name), True, PENDING_TIMEOUT):
+        run_in_background(generate_thumbnails, image.name, post_feeds(post))
+
+
+def ready_thumbnail_url(post, geometry):
+    """ URL готовой миниатюры поста или None; недостающую ставит в очередь. """
+    if not post.image:
+        return None
+    url = thumbnail_cache.get(thumbnail_key(post.image.name, geometry))
+    if url is None:
+        schedule_thumbnails(post)
+    return url
+
+
+def thumbnails_ready(image):
+    """ Готовы ли все миниатюры картинки. """
+    keys = [thumbnail_key(image.name, geometry)
+            for geometry in settings.POST_THUMBNAILS]
+    return len(thumbnail_cache.get_many(keys)) == len(keys)
@@ -0,0 +1,246 @@
+import heapq
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.paginator import EmptyPage, PageNotAnInteger
+from django.db import DEFAULT_DB_ALIAS
+
+from core.cache import NamespacedCache
+from core.stats import ProcessCounters
+
+from .models import AuthorStats, Follow, Post
+from .utils import FeedPaginator
+
+TIMELINE_KEY = 'timeline:{}'
+AUTHOR_RECENT_KEY = 'author_recent:{}'
+FEED_PATHS = ('timeline', 'hybrid', 'query')
+
+timeline_cache = NamespacedCache('posts:timelines')
+feed_path_counts = ProcessCounters()
+
+
+def _entry(post):
+    return (post.pub_date.timestamp(), post.pk, post.author_id)
+
+
+def _entries(queryset):
+    # Ленты хранятся до истечения срока: собранная с отстающей реплики
+    # так и осталась бы без постов, которых на ней ещё нет
+    queryset = queryset.using(DEFAULT_DB_ALIAS)
+    return [
+        (pub_date.timestamp(), pk, author_id)
+        for pub_date, pk, author_id in queryset.order_by(
+            '-pub_date', '-pk'
+        ).values_list('pub_date', 'pk', 'author_id')[
+            :settings.TIMELINE_LENGTH]
+    ]
+
+
+def _store(timelines, key=TIMELINE_KEY):
+    """ Кладёт собранные из БД ленты вместе со сроком их жизни. """
+    timeout = settings.TIMELINE_CACHE_TIMEOUT
+    expires = time.time() + timeout
+    timeline_cache.set_many(
+        {key.format(owner_id): (expires, entries)
+         for owner_id, entries in timelines.items()},
+        timeout,
+    )
+
+
+def _load(owner_ids, key=TIMELINE_KEY):
+    keys = {key.format(owner_id): owner_id for owner_id in owner_ids}
+    return {
+        keys[key]: entries
+        for key, (_, entries) in timeline_cache.get_many(keys).items()
+    }
+
+
+def _update(owner_ids, change, key=TIMELINE_KEY):
+    """ Правит уже собранные ленты: change(owner_id, entries).
+
+    Правка идёт без блокировки, и одновременные правки одной ленты
+    могут потерять запись. Поэтому срок жизни не продлевается: лента
+    живёт TIMELINE_CACHE_TIMEOUT с момента сборки и собирается заново.
+    """
+    keys = {key.format(owner_id): owner_id for owner_id in owner_ids}
+    found = timeline_cache.get_many(keys)
+    if not found:
+        return
+    timeout = int(min(expires for expires, _ in found.values())
+                  - time.time())
+    if timeout < 1:
+        return
+    timeline_cache.set_many({
+        key: (expires, change(keys[key], entries))
+        for key, (expires, entries) in found.items()
+    }, timeout)
+
+
+def _merge(entries, new_entries):
+    merged = sorted(set(entries) | set(new_entries), reverse=True)
+    return merged[:settings.TIMELINE_LENGTH]
+
+
+def is_celebrity(author_id):
+    """ Посты авторов с большим числом подписчиков не раскладываются. """
+    limit = settings.TIMELINE_FANOUT_LIMIT
+    return limit is not None and AuthorStats.objects.filter(
+        user_id=author_id, followers_count__gte=limit).exists()
+
+
+def followed_celebrities(user_id):
+    limit = settings.TIMELINE_FANOUT_LIMIT
+    if limit is None:
+        return []
+    return list(Follow.objects.filter(
+        user_id=user_id, author__stats__followers_count__gte=limit
+    ).values_list('author_id', flat=True))
+
+
+def build_timeline(user_id):
+    """ Собирает ленту подписок из БД и кладёт её в кэш. """
+    posts = Post.objects.filter(author__following__user_id=user_id)
+    if settings.TIMELINE_FANOUT_LIMIT is not None:
+        posts = posts.exclude(
+            author__stats__followers_count__gte=(
+                settings.TIMELINE_FANOUT_LIMIT))
+    entries = _entries(posts)
+    _store({user_id: entries})
+    return entries
+
+
+def get_timeline(user_id):
+    entries = _load([user_id]).get(user_id)
+    if entries is None:
+        entries = build_timeline(user_id)
+    return entries
+
+
+def get_author_recent(author_ids):
+    """ Свежие посты авторов-знаменитостей, общие для всех читателей. """
+    recent = _load(author_ids, AUTHOR_RECENT_KEY)
+    missing = {
+        author_id: _entries(Post.objects.filter(author_id=author_id))
+        for author_id in author_ids if author_id not in recent
+    }
+    _store(missing, AUTHOR_RECENT_KEY)
+    recent.update(missing)
+    return recent
+
+
+def merge_timelines(*timelines):
+    """ k-way слияние убывающих списков без повторов. """
+    seen = set()
+    merged = (
+        entry for entry in heapq.merge(*timelines, reverse=True)
+        if not (entry[1] in seen or seen.add(entry[1]))
+    )
+    return list(islice(merged, settings.TIMELINE_LENGTH))
+
+
+def follower_ids(author_id):
+    return Follow.objects.filter(author_id=author_id).values_list(
+        'user_id', flat=True)
+
+
+def push_post(post):
+    """ Раскладывает новый пост по уже собранным лентам подписчиков.
+
+    Для знаменитостей пост попадает только в их общий список
+    свежих постов, а в ленты читателей подмешивается при чтении.
+    """
+    entry = _entry(post)
+
+    def add_entry(owner_id, entries):
+        return _merge(entries, [entry])
+
+    if is_celebrity(post.author_id):
+        _update([post.author_id], add_entry, AUTHOR_RECENT_KEY)
+        return
+    _update(follower_ids(post.author_id), add_entry)
+
+
+def remove_post(post):
+    timeline_cache.delete(AUTHOR_RECENT_KEY.format(post.author_id))
+    if is_celebrity(post.author_id):
+        return
+    _update(follower_ids(post.author_id), lambda user_id, entries: [
+        entry for entry in entries if entry[1] != post.pk])
+
+
+def backfill_author(user_id, author_id):
+    """ Добавляет свежие посты автора в ленту нового подписчика. """
+    if is_celebrity(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id)
+    _update([user_id], lambda user_id, entries: _merge(
+        entries, _entries(posts)))
+
+
+def prune_author(user_id, author_id):
+    """ Убирает посты автора из ленты отписавшегося. """
+    _update([user_id], lambda user_id, entries: [
+        entry for entry in entries if entry[2] != author_id])
+
+
+def forget_timelines(user_ids, author_ids=()):
+    """ Сбрасывает готовые ленты: соберутся заново при чтении. """
+    timeline_cache.delete_many(
+        [TIMELINE_KEY.format(user_id) for user_id in user_ids]
+        + [AUTHOR_RECENT_KEY.format(author_id) for author_id in author_ids]
+    )
+
+
+def forget_if_limit_crossed(author_id, delta):
+    """ Сбрасывает ленты подписчиков автора, пересёкшего порог рассылки.
+
+    Ниже порога его посты лежат в лентах, выше - подмешиваются при
+    чтении, поэтому собранные по-старому ленты больше не годятся.
+    """
+    limit = settings.TIMELINE_FANOUT_LIMIT
+    if limit is None:
+        return
+    count = AuthorStats.objects.filter(user_id=author_id).values_list(
+        'followers_count', flat=True).first() or 0
+    if (count >= limit) != (count - delta >= limit):
+        forget_timelines(follower_ids(author_id), [author_id])
+
+
+def record_feed_path(path):
+    feed_path_counts.incr(path)
+
+
+def feed_path_stats():
+    """ Сколько запросов ленты подписок обслужил каждый путь в процессе. """
+    return {path: feed_path_counts.get(path) for path in FEED_PATHS}
+
+
+def timeline_page(queryset, request):
+    """ Страница ленты подписок из готового списка id.
+
+    Возвращает None, если страница лежит глубже хранимой ленты:
+    тогда её нужно строить обычным запросом.
+    """
+    entries = get_timeline(request.user.pk)
+    feed_path = 'timeline'
+    celebrities = followed_celebrities(request.user.pk)
+    if celebrities:
+        feed_path = 'hybrid'
+        entries = merge_timelines(
+            entries, *get_author_recent(celebrities).values())
+    paginator = FeedPaginator(entries, settings.POSTS_PER_PAGE)
+    page_number = request.GET.get('page')
+    try:
+        page = paginator.page(page_number or 1)
+    except PageNotAnInteger:
+        page = paginator.page(1)
+    except EmptyPage:
+        if len(entries) >= settings.TIMELINE_LENGTH:
+            return None
+        page = paginator.page(paginator.num_pages)
+    ids = [pk for _, pk, _ in page.object_list]
+    posts = queryset.in_bulk(ids)
+    page.object_list = [posts[pk] for pk in ids if pk in posts]
+    page.feed_path = feed_path
+    return page
@@ -1,6 +1,6 @@
-from django.urls import path
+from django.urls import path, re_path
 
-from . import views
+from . import api, syndication, views
 
 app_name = 'posts'
 
@@ -9,8 +9,22 @@ urlpatterns = [
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
     path('profile/<str:username>/', views.profile, name='profile'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
+    re_path(r'^(?P<feed_format>rss|atom)/$', syndication.syndication_feed,
+            {'kind': 'index'}, name='syndication_index'),
+    re_path(r'^group/(?P<key>[-\w]+)/(?P<feed_format>rss|atom)/$',
+            syndication.syndication_feed, {'kind': 'group'},
+            name='syndication_group'),
+    re_path(r'^profile/(?P<key>[^/]+)/(?P<feed_format>rss|atom)/$',
+            syndication.syndication_feed, {'kind': 'author'},
+            name='syndication_author'),
+    path('search/', views.search, name='search'),
+    path('search/api/', views.search_api, name='search_api'),
+    path('export/<str:kind>/', views.export, name='export'),
+    path('stats/', views.stats, name='stats'),
     path('create/', views.post_create, name='post_create'),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
+    path('posts/<int:post_id>/comments/', views.post_comments,
+         name='post_comments'),
     path('posts/<int:post_id>/comment/',
          views.add_comment,
          name='add_comment'),
@@ -19,4 +33,18 @@ urlpatterns = [
          name='profile_follow'),
     path('profile/<str:username>/unfollow/', views.profile_unfollow,
          name='profile_unfollow'),
+    path(f'api/{api.API_VERSION}/posts/', api.posts_list,
+         name='api_posts'),
+    path(f'api/{api.API_VERSION}/posts/<int:post_id>/', api.post_detail,
+         name='api_post_detail'),
+    path(f'api/{api.API_VERSION}/posts/<int:post_id>/comments/',
+         api.post_comments, name='api_post_comments'),
+    path(f'api/{api.API_VERSION}/groups/', api.groups_list,
+         name='api_groups'),
+    path(f'api/{api.API_VERSION}/groups/<slug:slug>/posts/',
+         api.group_posts, name='api_group_posts'),
+    path(f'api/{api.API_VERSION}/authors/<str:username>/posts/',
+         api.author_posts, name='api_author_posts'),
+    path(f'api/{api.API_VERSION}/follow/', api.follow_feed,
+         name='api_follow'),
 ]
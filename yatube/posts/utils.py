@@ -1,8 +1,180 @@
+import base64
+import binascii
+
 from django.core.paginator import Paginator
 from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+from .cache import feed_cache, get_feed_version
+from .models import Post
+
+FEED_COUNT_KEY = 'count:{}:{}'
+
+
+def feed_posts(queryset=None):
+    """ Посты для лент: автор и группа - в том же запросе. """
+    if queryset is None:
+        queryset = Post.objects.all()
+    return queryset.select_related('author', 'group')
+
+
+class FeedPaginator(Paginator):
+    """ Paginator с кэшированным и, для больших лент, оценочным числом постов.
+
+    Число постов ленты feed хранится в кэше под её версией, поэтому
+    сбрасывается теми же сигналами, что и фрагменты ленты. Точно
+    считается не больше PAGINATOR_EXACT_COUNT_LIMIT строк, дальше
+    берётся оценка estimate() (обычно из счётчиков). Страницы получают
+    атрибут page_window - номера соседних страниц для шаблона.
+    """
 
+    def __init__(self, object_list, per_page, feed=None, estimate=None,
+                 **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.feed = feed
+        self.estimate = estimate
 
-def paginate(queryset, request):
-    paginator = Paginator(queryset, settings.POSTS_PER_PAGE)
+    @cached_property
+    def count(self):
+        if self.feed is None:
+            return self._bounded_count()
+        key = FEED_COUNT_KEY.format(self.feed, get_feed_version(self.feed))
+        count = feed_cache.get(key)
+        if count is None:
+            count = self._bounded_count()
+            feed_cache.set(key, count, settings.FEED_CACHE_TIMEOUT)
+        return count
+
+    def _bounded_count(self):
+        if self.estimate is None:
+            return super().count
+        limit = settings.PAGINATOR_EXACT_COUNT_LIMIT
+        count = self.object_list[:limit + 1].count()
+        if count > limit:
+            return max(self.estimate() or 0, count)
+        return count
+
+    def page_window(self, number):
+        size = settings.PAGINATOR_WINDOW
+        first = max(1, number - size)
+        last = min(self.num_pages, number + size)
+        return range(first, last + 1)
+
+    def page(self, number):
+        page = super().page(number)
+        page.page_window = self.page_window(page.number)
+        return page
+
+
+def paginate(queryset, request, cursor=None, feed=None, estimate=None):
+    """ Постраничный вывод. С cursor=True - по курсору (pub_date, id).
+
+    feed - ключ ленты для кэша числа постов, estimate - оценка этого
+    числа для лент длиннее PAGINATOR_EXACT_COUNT_LIMIT.
+    """
+    if cursor is None:
+        cursor = (
+            settings.CURSOR_PAGINATION or 'cursor' in request.GET
+        )
+    if cursor:
+        return cursor_paginate(queryset, request.GET.get('cursor', ''))
+    paginator = FeedPaginator(
+        queryset, settings.POSTS_PER_PAGE, feed=feed, estimate=estimate)
     page_number = request.GET.get('page')
     return paginator.get_page(page_number)
+
+
+def encode_cursor(direction, obj):
+    """ Непрозрачный курсор: направление и ключ (pub_date, id).
+
+    obj - объект модели или строка .values() с полями pub_date и id.
+    """
+    if isinstance(obj, dict):
+        pub_date, pk = obj['pub_date'], obj['id']
+    else:
+        pub_date, pk = obj.pub_date, obj.pk
+    raw = f'{direction}|{pub_date.isoformat()}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """ Разбирает курсор. Для битого курсора возвращает None. """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        direction, pub_date, pk = raw.split('|')
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if direction not in ('next', 'prev') or pub_date is None:
+        return None
+    return direction, pub_date, pk
+
+
+class CursorPage:
+    """ Страница ленты без COUNT(*) и OFFSET. """
+    is_cursor = True
+
+    def __init__(self, object_list, cursor, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.number = cursor
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<CursorPage {self.number or "first"}>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def cursor_paginate(queryset, token, per_page=None):
+    """ Страница по курсору: стоимость не зависит от её номера. """
+    per_page = per_page or settings.POSTS_PER_PAGE
+    position = decode_cursor(token) if token else None
+    if position is None:
+        token = ''
+        direction = 'next'
+        page = queryset.order_by('-pub_date', '-pk')
+    else:
+        direction, pub_date, pk = position
+        if direction == 'next':
+            page = queryset.filter(
+                Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk)
+            ).order_by('-pub_date', '-pk')
+        else:
+            page = queryset.filter(
+                Q(pub_date__gt=pub_date) | Q(pub_date=pub_date, pk__gt=pk)
+            ).order_by('pub_date', 'pk')
+    object_list = list(page[:per_page + 1])
+    has_more = len(object_list) > per_page
+    object_list = object_list[:per_page]
+    if direction == 'prev':
+        object_list.reverse()
+        has_next, has_previous = True, has_more
+    else:
+        has_next, has_previous = has_more, position is not None
+    next_cursor = previous_cursor = None
+    if object_list and has_next:
+        next_cursor = encode_cursor('next', object_list[-1])
+    if object_list and has_previous:
+        previous_cursor = encode_cursor('prev', object_list[0])
+    return CursorPage(object_list, token, next_cursor, previous_cursor)
@@ -1,65 +1,228 @@
+import os
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
+from django.db.models import Sum
+from django.http import (Http404, HttpResponseBadRequest, JsonResponse,
+                         StreamingHttpResponse)
 from django.shortcuts import get_object_or_404, redirect, render
 
+from core.cache import cache_stats
+from core.db import read_from_replicas
+
+from .conditional import (conditional_page, conditional_stats, group_etag,
+                          group_last_modified, index_etag,
+                          index_last_modified, post_etag,
+                          post_last_modified, profile_etag,
+                          profile_last_modified)
+from .cache import (INDEX_FEED, feed_cache_context, group_feed,
+                    profile_feed)
+from .counters import get_author_stats
+from .export import EXPORTS, FORMATS, export_lines
 from .forms import PostForm, CommentForm
-from .models import Group, Post, User, Follow
-from .utils import paginate
+from .models import AuthorStats, Group, Post, User, Follow
+from .search import find_posts
+from .thumbnails import schedule_thumbnails
+from .timelines import feed_path_stats, record_feed_path, timeline_page
+from .utils import cursor_paginate, feed_posts, paginate
+
+
+def latest_post_id():
+    """ Оценка числа постов сверху: id последнего поста. """
+    return Post.objects.order_by('-pk').values_list('pk', flat=True).first()
 
 
+def followed_posts_count(user):
+    """ Оценка ленты подписок по счётчикам постов авторов. """
+    return AuthorStats.objects.filter(
+        user__following__user=user,
+    ).aggregate(total=Sum('posts_count'))['total']
+
+
+@read_from_replicas(changed_at=index_last_modified)
+@conditional_page('index', index_etag, index_last_modified)
 def index(request):
     """ Возвращает главную страницу """
     template = 'posts/index.html'
-    posts = Post.objects.all()
-    paginator = paginate(posts, request)
+    posts = feed_posts()
+    paginator = paginate(
+        posts, request, feed=INDEX_FEED, estimate=latest_post_id)
     context = {
         'page_obj': paginator,
+        **feed_cache_context(INDEX_FEED),
     }
     return render(request, template, context)
 
 
+@read_from_replicas(changed_at=group_last_modified)
+@conditional_page('group_posts', group_etag, group_last_modified)
 def group_posts(request, slug):
     """ Посты, отфильтрованные по группам """
     template = 'posts/group_list.html'
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    paginator = paginate(posts, request)
+    posts = feed_posts(group.posts.all())
+    paginator = paginate(
+        posts, request, feed=group_feed(group.pk),
+        estimate=lambda: group.posts_count)
     context = {
         'group': group,
         'page_obj': paginator,
+        **feed_cache_context(group_feed(group.pk)),
     }
     return render(request, template, context)
 
 
+@read_from_replicas(changed_at=profile_last_modified)
+@conditional_page('profile', profile_etag, profile_last_modified)
 def profile(request, username):
     template = 'posts/profile.html'
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.all()
-    paginator = paginate(posts, request)
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username)
+    author_stats = get_author_stats(author)
+    posts = feed_posts(author.posts.all())
+    paginator = paginate(
+        posts, request, feed=profile_feed(author.pk),
+        estimate=lambda: author_stats.posts_count)
     following = (
         request.user.is_authenticated
         and request.user.follower.filter(author=author).exists()
     )
     context = {
         'author': author,
+        'author_stats': author_stats,
         'page_obj': paginator,
         'following': following,
+        **feed_cache_context(profile_feed(author.pk)),
     }
     return render(request, template, context)
 
 
+@read_from_replicas(changed_at=post_last_modified)
+@conditional_page('post_detail', post_etag, post_last_modified)
 def post_detail(request, post_id):
     template = 'posts/post_detail.html'
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        feed_posts().select_related('author__stats'), pk=post_id)
     form = CommentForm()
-    comments = post.comments.all()
+    comments = cursor_paginate(
+        post.comments.select_related('author'), '',
+        settings.COMMENTS_PER_PAGE)
     context = {
         'post': post,
+        'author_stats': get_author_stats(post.author),
         'comments': comments,
         'form': form,
     }
     return render(request, template, context)
 
 
+def search(request):
+    """ Поиск по постам и комментариям """
+    template = 'posts/search.html'
+    query = request.GET.get('q', '').strip()
+    results, next_cursor = find_posts(
+        query,
+        group_slug=request.GET.get('group', ''),
+        author_username=request.GET.get('author', ''),
+        cursor=request.GET.get('cursor'),
+        limit=settings.POSTS_PER_PAGE,
+    )
+    context = {
+        'query': query,
+        'results': results,
+        'next_cursor': next_cursor,
+    }
+    return render(request, template, context)
+
+
+def search_api(request):
+    """ Поиск в JSON: совпадения и курсор следующей страницы """
+    results, next_cursor = find_posts(
+        request.GET.get('q', '').strip(),
+        group_slug=request.GET.get('group', ''),
+        author_username=request.GET.get('author', ''),
+        cursor=request.GET.get('cursor'),
+        limit=settings.POSTS_PER_PAGE,
+    )
+    return JsonResponse({
+        'results': [
+            {
+                'kind': result['kind'],
+                'post_id': result['post'].pk,
+                'author': result['post'].author.username,
+                'group': (result['post'].group.slug
+                          if result['post'].group else None),
+                'pub_date': result['post'].pub_date,
+                'snippet': result['snippet'],
+            }
+            for result in results
+        ],
+        'next_cursor': next_cursor,
+    })
+
+
+def post_comments(request, post_id):
+    """ Следующая страница комментариев: HTML-фрагмент или JSON """
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    comments = cursor_paginate(
+        post.comments.select_related('author'),
+        request.GET.get('cursor', ''),
+        settings.COMMENTS_PER_PAGE,
+    )
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'comments': [
+                {
+                    'id': comment.pk,
+                    'author': comment.author.username,
+                    'text': comment.text,
+                    'pub_date': comment.pub_date,
+                }
+                for comment in comments
+            ],
+            'next_cursor': comments.next_cursor,
+        })
+    context = {
+        'post': post,
+        'comments': comments,
+    }
+    return render(request, 'includes/comment_list.html', context)
+
+
+@staff_member_required
+def export(request, kind):
+    """ Потоковая выгрузка постов или комментариев (ndjson или csv) """
+    export_format = request.GET.get('format', 'ndjson')
+    if kind not in EXPORTS or export_format not in FORMATS:
+        raise Http404
+    try:
+        lines = export_lines(
+            kind, export_format,
+            group=request.GET.get('group'),
+            author=request.GET.get('author'),
+            since=request.GET.get('since'),
+            until=request.GET.get('until'),
+        )
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+    response = StreamingHttpResponse(
+        lines, content_type=FORMATS[export_format])
+    response['Content-Disposition'] = (
+        f'attachment; filename="{kind}.{export_format}"')
+    return response
+
+
+@staff_member_required
+def stats(request):
+    """ Счётчики воркера: 304, пути ленты подписок, кэш (для сотрудников) """
+    return JsonResponse({
+        'conditional': conditional_stats(),
+        'feed_paths': feed_path_stats(),
+        'cache': {'pid': os.getpid(), 'namespaces': cache_stats()},
+    })
+
+
 @login_required
 def post_create(request):
     template = 'posts/create_post.html'
@@ -68,6 +231,7 @@ def post_create(request):
         post = form.save(commit=False)
         post.author = request.user
         form.save()
+        schedule_thumbnails(post)
         return redirect('posts:profile', post.author)
     context = {
         'form': form,
@@ -78,8 +242,7 @@ def post_create(request):
 @login_required
 def post_edit(request, post_id):
     template = 'posts/create_post.html'
-    post = get_object_or_404(
-        Post.objects.select_related('group', 'author'), pk=post_id)
+    post = get_object_or_404(feed_posts(), pk=post_id)
     if request.user != post.author:
         return redirect('posts:post_detail', post_id)
     form = PostForm(
@@ -89,6 +252,7 @@ def post_edit(request, post_id):
     )
     if form.is_valid():
         form.save()
+        schedule_thumbnails(post)
         return redirect('posts:post_detail', post.pk)
     context = {
         'form': form,
@@ -111,12 +275,24 @@ def add_comment(request, post_id):
 
 
 @login_required
+@read_from_replicas
 def follow_index(request):
     template = 'posts/follow.html'
-    queryset = Post.objects.select_related('author', 'group').filter(
-        author__following__user=request.user)
-    context = {'page_obj': paginate(queryset, request)}
-    return render(request, template, context)
+    page = None
+    if settings.FOLLOW_TIMELINES and 'cursor' not in request.GET:
+        page = timeline_page(feed_posts(), request)
+    if page is None:
+        queryset = feed_posts(
+            Post.objects.filter(author__following__user=request.user))
+        page = paginate(
+            queryset, request,
+            estimate=lambda: followed_posts_count(request.user))
+    feed_path = getattr(page, 'feed_path', 'query')
+    record_feed_path(feed_path)
+    context = {'page_obj': page}
+    response = render(request, template, context)
+    response['X-Feed-Path'] = feed_path
+    return response
 
 
 @login_required
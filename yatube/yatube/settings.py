@@ -37,10 +37,27 @@ ALLOWED_HOSTS = [
 ]
 
 # Enabled cache
-CACHES = {
-    'default': {
+# local - свой кэш у каждого процесса (разработка и тесты);
+# file и database - общий кэш для всех воркеров на одном хосте,
+# для database нужна таблица: python manage.py createcachetable
+CACHE_PROFILES = {
+    'local': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+    'database': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'yatube_cache',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+}
+CACHE_PROFILE = os.environ.get('YATUBE_CACHE_PROFILE', 'local')
+CACHES = {
+    'default': CACHE_PROFILES[CACHE_PROFILE],
 }
 
 # Application definition
@@ -55,11 +72,14 @@ INSTALLED_APPS = [
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
+    'django.contrib.sitemaps',
     'django.contrib.staticfiles',
     'sorl.thumbnail',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestMetricsMiddleware',
+    'core.middleware.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -98,8 +118,40 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+    },
+    # Копия основной БД только для чтения (YATUBE_REPLICA_DB - путь
+    # к файлу копии); в тестах - зеркало default
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get(
+            'YATUBE_REPLICA_DB', os.path.join(BASE_DIR, 'db.sqlite3')),
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+DATABASE_ROUTERS = ['core.db.ReplicaRouter']
+# Прагмы, которые выполняются для каждого соединения SQLite.
+# tuned: WAL не держит читателей за писателем, synchronous=NORMAL
+# в режиме WAL не теряет данные при падении процесса, писатели ждут
+# блокировку busy_timeout мс вместо ошибки database is locked
+SQLITE_PROFILES = {
+    'default': {},
+    'tuned': {
+        'journal_mode': 'wal',
+        'synchronous': 'normal',
+        'busy_timeout': 5000,
+        'mmap_size': 256 * 1024 * 1024,
+        # Отрицательное значение - размер в КиБ
+        'cache_size': -64 * 1024,
+        'temp_store': 'memory',
+    },
 }
+SQLITE_PROFILE = os.environ.get('YATUBE_SQLITE_PROFILE', 'tuned')
+SQLITE_PRAGMAS = SQLITE_PROFILES[SQLITE_PROFILE]
+# Реплики, с которых читают страницы лент и постов
+DATABASE_REPLICAS = (
+    ['replica'] if 'YATUBE_REPLICA_DB' in os.environ else [])
+# Столько секунд после своей записи пользователь читает с основной БД
+DATABASE_REPLICA_LAG = 5
 
 
 # Password validation
@@ -148,3 +200,76 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 POSTS_PER_PAGE = 10
 CHAR_LIMIT = 15
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
+# Пагинация лент по курсору (pub_date, id) вместо номера страницы
+CURSOR_PAGINATION = False
+# Фрагменты лент инвалидируются сигналами, поэтому живут долго;
+# случайная добавка разносит их истечение во времени
+FEED_CACHE_TIMEOUT = 60 * 60
+FEED_CACHE_JITTER = 5 * 60
+# Готовые ленты подписок в кэше (fan-out on write) и их длина; правки
+# не продлевают срок жизни, и лента раз в срок собирается из БД
+FOLLOW_TIMELINES = False
+TIMELINE_LENGTH = 500
+TIMELINE_CACHE_TIMEOUT = FEED_CACHE_TIMEOUT
+# Посты авторов с таким числом подписчиков подмешиваются при чтении
+TIMELINE_FANOUT_LIMIT = 1000
+# Фоновые задачи (нарезка миниатюр) в локальном пуле потоков
+BACKGROUND_WORKERS = 2
+# Размеры миниатюр постов, которые готовятся заранее
+POST_THUMBNAILS = {
+    '960x339': {'crop': 'center', 'upscale': True},
+}
+# Метрики запросов: медленные запросы пишутся в лог со всеми SQL
+SLOW_REQUEST_MS = 500
+SLOW_REQUEST_SAMPLE_RATE = 1.0
+SLOW_REQUEST_MAX_QUERIES = 1000
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        # INFO - строка на каждый запрос, WARNING - только медленные
+        'yatube.requests': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+# Комментариев на странице поста и в каждой догружаемой порции
+COMMENTS_PER_PAGE = 20
+# Число постов в ленте считается точно до этого предела, дальше - оценка;
+# в пагинаторе показываются ссылки на столько соседних страниц
+PAGINATOR_EXACT_COUNT_LIMIT = 10000
+PAGINATOR_WINDOW = 3
+# Готовые карточки постов; ключ меняется вместе с содержимым карточки
+POST_CARD_CACHE_TIMEOUT = 24 * 60 * 60
+# Защита от лавины пересчётов: пересчитывает один владелец блокировки,
+# остальные отдают устаревшее значение, которое хранится ещё столько
+# секунд после срока, или ждут не дольше CACHE_LOCK_WAIT
+CACHE_LOCK_TIMEOUT = 30
+CACHE_LOCK_WAIT = 2
+CACHE_STALE_TIMEOUT = 5 * 60
+CACHE_EARLY_EXPIRATION_BETA = 1.0
+# Наибольший размер страницы JSON API (?limit=)
+API_MAX_LIMIT = 100
+# Строк в одной пачке при потоковой выгрузке постов и комментариев
+EXPORT_CHUNK_SIZE = 2000
+# Импорт: записей в одной пачке bulk_create и потоков копирования картинок
+IMPORT_BATCH_SIZE = 2000
+IMPORT_IMAGE_WORKERS = 8
+# RSS и Atom: постов в ленте и срок хранения готовой ленты в кэше
+# (раньше её сбрасывает новая версия ленты)
+SYNDICATION_ITEMS = 20
+SYNDICATION_CACHE_TIMEOUT = 24 * 60 * 60
+# Карта сайта: файлы пишет generate_sitemaps, отдаёт веб-сервер;
+# в куске не больше SITEMAP_CHUNK_SIZE объектов (протокол - до 50000)
+SITEMAP_ROOT = os.path.join(BASE_DIR, 'sitemaps')
+SITEMAP_URL = '/sitemaps/'
+SITEMAP_CHUNK_SIZE = 10000
+SITEMAP_DOMAIN = 'localhost:8000'